@@ -30,26 +30,29 @@ class PositionAnalyzer:
         """
         material = 0
         position = 0
-        
+
+        # Обе составляющие зависят только от (цвет, тип, клетка) — берём
+        # их из таблиц, посчитанных при импорте, вместо арифметики на фигуру
+        values = PositionAnalyzer.PIECE_VALUES
         for x in range(8):
             for y in range(8):
                 piece = board[x][y]
                 if piece:
-                    value = PositionAnalyzer.PIECE_VALUES.get(piece.type, 0)
-                    
+                    value = values.get(piece.type, 0)
+
                     # Материальный баланс
                     if piece.color == "white":
                         material += value
                     else:
                         material -= value
-                    
+
                     # Позиционная оценка (упрощённая)
-                    position += PositionAnalyzer._evaluate_piece_position(piece, x, y)
-        
+                    position += _POSITION_TABLE[(piece.color, piece.type)][x * 8 + y]
+
         # Если оцениваем для чёрных, инвертируем
         if color == "black":
             return -(material + position * 0.1)
-        
+
         return material + position * 0.1
     
     @staticmethod
@@ -170,7 +173,22 @@ class PositionAnalyzer:
                         material -= value
         
         threats["material_balance"] = material if color == "white" else -material
-        
+
         return threats
 
 
+# Таблицы «(цвет, тип) -> оценка по 64 клеткам», развёрнутые из
+# _evaluate_piece_position один раз при импорте. Полноценные bitboard'ы
+# здесь не окупились бы: движок объектный и разделён с клиентской логикой,
+# а горячая часть оценки — именно эти повторяющиеся вычисления на фигуру
+_POSITION_TABLE: Dict[Tuple[str, PieceType], tuple] = {
+    (color, piece_type): tuple(
+        PositionAnalyzer._evaluate_piece_position(Piece(color, piece_type, (x, y)), x, y)
+        for x in range(8)
+        for y in range(8)
+    )
+    for color in ("white", "black")
+    for piece_type in PieceType
+}
+
+
@@ -34,6 +34,20 @@ except Exception as e:
     raise ImportError(f"Ошибка при импорте chess_engine из {chess_engine_path}: {e}") from e
 
 
+# Направления и прыжки по типам фигур, поднятые на уровень модуля:
+# раньше списки пересоздавались на каждый вызов get_valid_moves
+# (в общем движке ту же роль играют таблицы по клеткам)
+_DIRS = {
+    PieceType.ROOK: ((-1, 0), (1, 0), (0, -1), (0, 1)),
+    PieceType.BISHOP: ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+    PieceType.QUEEN: ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)),
+}
+_JUMPS = {
+    PieceType.KNIGHT: ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)),
+    PieceType.KING: ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)),
+}
+
+
 class Piece(ChessPiece):
     """
     Класс шахматной фигуры для онлайн версии.
@@ -45,7 +59,10 @@ class Piece(ChessPiece):
         position: Позиция на доске (x, y)
         moved: Флаг, была ли фигура перемещена
     """
-    
+
+    # Новых атрибутов нет — пустые слоты сохраняют компактность базового класса
+    __slots__ = ()
+
     def __init__(self, color: str, piece_type: PieceType, position: Tuple[int, int]):
         """
         Инициализирует шахматную фигуру.
@@ -86,35 +103,31 @@ class Piece(ChessPiece):
                 if not self.moved and 0 <= y + 2 * direction < 8 and not board[x][y + 2 * direction]:
                     moves.append((x, y + 2 * direction))
             # Атаки по диагонали
-            for dx in [-1, 1]:
+            for dx in (-1, 1):
                 nx, ny = x + dx, y + direction
                 if 0 <= nx < 8 and 0 <= ny < 8:
                     target = board[nx][ny]
                     if target and target.color != self.color:
                         attacks.append((nx, ny))
-                    # Взятие на проходе
-                    elif en_passant_target and (nx, ny) == en_passant_target:
+                    # Взятие на проходе: покомпонентное сравнение без кортежа
+                    elif (en_passant_target is not None
+                          and nx == en_passant_target[0] and ny == en_passant_target[1]):
                         attacks.append((nx, ny))
         
         elif self.type == PieceType.ROOK:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
-        
+            moves, attacks = self._get_linear_moves(board, _DIRS[PieceType.ROOK])
+
         elif self.type == PieceType.KNIGHT:
-            offsets = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-            moves, attacks = self._get_jump_moves(board, offsets)
-        
+            moves, attacks = self._get_jump_moves(board, _JUMPS[PieceType.KNIGHT])
+
         elif self.type == PieceType.BISHOP:
-            directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
-        
+            moves, attacks = self._get_linear_moves(board, _DIRS[PieceType.BISHOP])
+
         elif self.type == PieceType.QUEEN:
-            directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
-        
+            moves, attacks = self._get_linear_moves(board, _DIRS[PieceType.QUEEN])
+
         elif self.type == PieceType.KING:
-            offsets = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-            moves, attacks = self._get_jump_moves(board, offsets)
+            moves, attacks = self._get_jump_moves(board, _JUMPS[PieceType.KING])
             # Рокировка
             if not self.moved:
                 if self._can_castle(board, 'kingside', check_castling_safety):
@@ -202,6 +215,7 @@ class ChessGame:
         self.winner = None
         self.en_passant_target: Optional[Tuple[int, int]] = None  # Клетка для взятия на проходе
         self.move_history: List[dict] = []  # История ходов
+        self._undo_stack: List[dict] = []  # Обратимые диффы ходов для undo()
         self._init_board()
     
     def _init_board(self):
@@ -242,29 +256,18 @@ class ChessGame:
         """
         Проверяет, атакована ли клетка фигурами указанного цвета.
         Использует оптимизированный метод из общего движка.
-        
+
+        Piece наследуется от ChessPiece, поэтому доска передаётся в движок
+        как есть — без поклеточного копирования в промежуточный формат.
+
         Args:
             square: Позиция для проверки (x, y)
             by_color: Цвет атакующих фигур
-            
+
         Returns:
             True если клетка атакована
         """
-        # Преобразуем доску в формат для общего движка
-        chess_board = [[None for _ in range(8)] for _ in range(8)]
-        for x in range(8):
-            for y in range(8):
-                piece = self.board[x][y]
-                if piece:
-                    chess_board[x][y] = ChessPiece(piece.color, piece.type, piece.position)
-                    chess_board[x][y].moved = piece.moved
-        
-        return ChessRules.is_square_attacked(square, by_color, chess_board)
-    
-    def _check_castling_safety(self, square: Tuple[int, int], king_color: str) -> bool:
-        """Проверяет, атакована ли клетка противником (для рокировки)"""
-        opponent = "black" if king_color == "white" else "white"
-        return self._is_square_attacked(square, opponent)
+        return ChessRules.is_square_attacked(square, by_color, self.board)
     
     def get_valid_moves(self, position: Tuple[int, int]) -> dict:
         """
@@ -281,10 +284,19 @@ class ChessGame:
         if not piece:
             return {"moves": [], "attacks": []}
         
+        # Для рокировки безопасность трёх клеток пути короля проверяется по
+        # одному заранее собранному множеству атакованных клеток, а не тремя
+        # полными обходами доски
+        check_castling_safety = None
+        if piece.type == PieceType.KING and not piece.moved:
+            opponent = "black" if piece.color == "white" else "white"
+            attacked = ChessRules.attacked_squares(opponent, self.board)
+            check_castling_safety = lambda sq, color: sq in attacked
+
         moves, attacks = piece.get_valid_moves(
-            self.board, 
+            self.board,
             self.en_passant_target,
-            self._check_castling_safety
+            check_castling_safety
         )
         
         # Фильтруем ходы, которые оставляют короля под шахом
@@ -332,16 +344,7 @@ class ChessGame:
         Returns:
             True если король под шахом
         """
-        # Преобразуем доску в формат для общего движка
-        chess_board = [[None for _ in range(8)] for _ in range(8)]
-        for x in range(8):
-            for y in range(8):
-                piece = self.board[x][y]
-                if piece:
-                    chess_board[x][y] = ChessPiece(piece.color, piece.type, piece.position)
-                    chess_board[x][y].moved = piece.moved
-        
-        return ChessRules.is_in_check(color, chess_board)
+        return ChessRules.is_in_check(color, self.board)
     
     def _is_checkmate(self, color: str) -> bool:
         """
@@ -354,16 +357,7 @@ class ChessGame:
         Returns:
             True если мат
         """
-        # Преобразуем доску в формат для общего движка
-        chess_board = [[None for _ in range(8)] for _ in range(8)]
-        for x in range(8):
-            for y in range(8):
-                piece = self.board[x][y]
-                if piece:
-                    chess_board[x][y] = ChessPiece(piece.color, piece.type, piece.position)
-                    chess_board[x][y].moved = piece.moved
-        
-        return ChessRules.is_checkmate(color, chess_board, self.get_valid_moves)
+        return ChessRules.is_checkmate(color, self.board, self.get_valid_moves)
     
     def _is_stalemate(self, color: str) -> bool:
         """
@@ -376,16 +370,7 @@ class ChessGame:
         Returns:
             True если пат
         """
-        # Преобразуем доску в формат для общего движка
-        chess_board = [[None for _ in range(8)] for _ in range(8)]
-        for x in range(8):
-            for y in range(8):
-                piece = self.board[x][y]
-                if piece:
-                    chess_board[x][y] = ChessPiece(piece.color, piece.type, piece.position)
-                    chess_board[x][y].moved = piece.moved
-        
-        return ChessRules.is_stalemate(color, chess_board, self.get_valid_moves)
+        return ChessRules.is_stalemate(color, self.board, self.get_valid_moves)
     
     def make_move(self, from_pos: Tuple[int, int], to_pos: Tuple[int, int], custom_moves: dict = None, promotion_piece: str = None) -> dict:
         """
@@ -458,13 +443,30 @@ class ChessGame:
             "castling": None,
             "promotion": None
         }
-        
+
+        # Обратимый дифф хода: undo() восстанавливает позицию за O(1)
+        # вместо пересоздания игры и воспроизведения всей истории
+        undo_entry = {
+            "from": from_pos,
+            "to": to_pos,
+            "piece": piece,
+            "piece_moved_before": piece.moved,
+            "captured_piece": None,
+            "captured_pos": None,
+            "castling_rook": None,
+            "en_passant_before": self.en_passant_target,
+            "game_over_before": self.game_over,
+            "winner_before": self.winner
+        }
+
         # Захват фигуры
         captured = None
         target = self.board[to_pos[0]][to_pos[1]]
         if target:
             captured = target.to_dict()
             move_record["captured"] = captured
+            undo_entry["captured_piece"] = target
+            undo_entry["captured_pos"] = to_pos
         
         # Взятие на проходе
         en_passant_capture = False
@@ -476,6 +478,8 @@ class ChessGame:
                 captured = captured_pawn.to_dict()
                 move_record["captured"] = captured
                 move_record["en_passant"] = True
+                undo_entry["captured_piece"] = captured_pawn
+                undo_entry["captured_pos"] = (to_pos[0], captured_pawn_y)
                 self.board[to_pos[0]][captured_pawn_y] = None
                 en_passant_capture = True
         
@@ -507,6 +511,7 @@ class ChessGame:
                 rook.moved = True
                 castling_type = "queenside"
             move_record["castling"] = castling_type
+            undo_entry["castling_rook"] = (rook, 7 if castling_type == "kingside" else 0)
         
         # Выполняем ход
         self.board[from_pos[0]][from_pos[1]] = None
@@ -536,6 +541,7 @@ class ChessGame:
         
         # Сохраняем ход в историю
         self.move_history.append(move_record)
+        self._undo_stack.append(undo_entry)
         
         # Переключаем игрока
         self.current_player = "black" if self.current_player == "white" else "white"
@@ -564,3 +570,50 @@ class ChessGame:
             "en_passant_target": self.en_passant_target
         }
 
+    def undo(self) -> bool:
+        """
+        Отменяет последний ход, применяя обратимый дифф из стека.
+
+        Каждый make_move кладёт в стек всё, что нужно для отката: взятую
+        фигуру и её клетку, ладью рокировки, прежний en passant target и
+        флаг moved. Откат выполняется за O(1) вместо пересоздания игры и
+        воспроизведения всей истории (O(N) ходов с пересчётом легальности).
+
+        Returns:
+            True если ход отменён, False если отменять нечего
+        """
+        if not self._undo_stack:
+            return False
+        entry = self._undo_stack.pop()
+        piece = entry["piece"]
+        fx, fy = entry["from"]
+        tx, ty = entry["to"]
+
+        # Возвращаем фигуру; при превращении на to_pos стоит новая фигура —
+        # она просто затирается исходной пешкой
+        self.board[tx][ty] = None
+        self.board[fx][fy] = piece
+        piece.position = (fx, fy)
+        piece.moved = entry["piece_moved_before"]
+
+        # Восстанавливаем взятую фигуру (при взятии на проходе её клетка
+        # не совпадает с to_pos)
+        if entry["captured_piece"] is not None:
+            cx, cy = entry["captured_pos"]
+            self.board[cx][cy] = entry["captured_piece"]
+
+        # Возвращаем ладью рокировки на исходную позицию
+        if entry["castling_rook"] is not None:
+            rook, home_x = entry["castling_rook"]
+            self.board[rook.position[0]][rook.position[1]] = None
+            self.board[home_x][fy] = rook
+            rook.position = (home_x, fy)
+            rook.moved = False
+
+        self.en_passant_target = entry["en_passant_before"]
+        self.move_history.pop()
+        self.current_player = piece.color
+        self.game_over = entry["game_over_before"]
+        self.winner = entry["winner_before"]
+        return True
+
@@ -3,17 +3,24 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response as StarletteResponse
+import base64
+import gzip
+import hashlib
 import json
+import socket
 import uuid
 import time
 import os
 from pathlib import Path
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 from datetime import datetime
+import orjson
 import pytz
-from game_logic import ChessGame
+from sortedcontainers import SortedKeyList
+from game_logic import ChessGame, ChessBoard
 from rating import RatingSystem
 from analysis import PositionAnalyzer
 from pgn import PGNExporter, PGNImporter
@@ -21,17 +28,27 @@ from tournament import Tournament, tournaments, TournamentType, TournamentStatus
 from logger import setup_logger
 from schemas import (
     MoveRequest, GetValidMovesRequest, CustomMoveRequest, SaveCardRequest,
-    ToggleCardRequest, DeleteCardRequest, ChatRequest, ResignRequest,
+    ToggleCardRequest, DeleteCardRequest, ResetCustomMovesRequest, RequestFullStateRequest,
+    ChatRequest, ResignRequest,
     OfferDrawRequest, DrawResponseRequest, RequestUndoRequest, UndoResponseRequest,
     RequestRematchRequest, RematchResponseRequest, SetTimeControlRequest,
     GetPositionAnalysisRequest, ExportPGNRequest, GetRatingRequest,
     CreateTournamentRoomRequest, JoinTournamentRoomRequest
 )
-from pydantic import ValidationError
+from pydantic import ValidationError, TypeAdapter
 from database import db
 import aiosqlite
 import asyncio
 
+# Подменяем стандартный event loop на uvloop как можно раньше — до того,
+# как uvicorn/asyncio создадут цикл. Так uvloop работает и при запуске
+# через внешний `uvicorn main:app` (Docker), а не только через __main__
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass  # Windows или uvloop не установлен — остаёмся на asyncio
+
 logger = setup_logger()
 
 # Определяем базовый путь в зависимости от окружения
@@ -54,24 +71,47 @@ _app_ready = False
 
 # Middleware для отключения кэширования статических файлов v2.7 и логирования запросов
 # ВАЖНО: Этот middleware должен быть добавлен ПЕРВЫМ, чтобы логировать все запросы
-class NoCacheMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Логируем запросы к API
-        if "/api/" in str(request.url.path):
-            logger.info(f"API запрос: {request.method} {request.url.path}")
-        
-        response = await call_next(request)
-        
-        # Логируем ответ для API запросов
-        if "/api/" in str(request.url.path):
-            logger.info(f"API ответ: {request.method} {request.url.path} -> {response.status_code}")
-        
-        # Отключаем кэширование для всех файлов v2.7
-        if "/v2.7" in str(request.url):
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-        return response
+# Чистый ASGI вместо BaseHTTPMiddleware: тот оборачивает каждый ответ в
+# отдельную задачу с очередью и заметно дорожает на каждом HTTP-запросе
+# no-cache без no-store: клиент обязан ревалидировать каждую загрузку, но
+# может хранить копию — совпавший ETag отвечается 304 без тела
+_NO_CACHE_HEADERS = [
+    (b"cache-control", b"no-cache, must-revalidate"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+
+
+class NoCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        is_api = "/api/" in path
+        if is_api:
+            logger.info(f"API запрос: {scope['method']} {path}")
+
+        no_cache = "/v2.7" in path
+        if not (is_api or no_cache):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if is_api:
+                    logger.info(f"API ответ: {scope['method']} {path} -> {message['status']}")
+                # Отключаем кэширование для всех файлов v2.7
+                if no_cache:
+                    message = {
+                        **message,
+                        "headers": list(message.get("headers", [])) + _NO_CACHE_HEADERS,
+                    }
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 app.add_middleware(NoCacheMiddleware)
 
@@ -191,7 +231,7 @@ async def create_tournament_room(request: CreateTournamentRoomRequest):
             "start_time_utc": start_time_utc,  # UTC для внутренних проверок
             "players": [],
             "spectators": [],
-            "created_at": time.time(),
+            "created_at": time.monotonic(),
             "status": "waiting"
         }
         
@@ -362,7 +402,7 @@ async def join_tournament_room(room_id: str, request: JoinTournamentRoomRequest)
 @app.on_event("startup")
 async def startup_event():
     """Инициализация базы данных при запуске приложения."""
-    global _app_ready
+    global _app_ready, matchmaking_event
     # Сразу помечаем приложение как готовое для healthcheck
     _app_ready = True
     logger.info("Приложение запускается...")
@@ -378,6 +418,11 @@ async def startup_event():
         loop.create_task(initialize_db_background())
         # Запускаем фоновую задачу для проверки времени старта турнирных комнат
         loop.create_task(check_tournament_rooms_start_time())
+        # Фоновая очистка опустевших комнат
+        loop.create_task(reap_empty_rooms())
+        # Единственная задача подбора соперников
+        matchmaking_event = asyncio.Event()
+        loop.create_task(matchmaking_matcher())
         logger.info("Приложение готово принимать запросы (инициализация БД в фоне)")
     except Exception as e:
         logger.error(f"Ошибка при запуске приложения: {e}", exc_info=True)
@@ -391,95 +436,286 @@ async def initialize_db_background():
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}", exc_info=True)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Закрывает общее соединение с БД: его поток не-демонический,
+    без явного close процесс не завершится."""
+    await db.close()
+
 # Хранилище активных игр и соединений
 games: Dict[str, ChessGame] = {}
 rooms: Dict[str, Dict] = {}  # room_id -> {players: [], game: ChessGame}
 waiting_players: List[WebSocket] = []  # Очередь для matchmaking
-matchmaking_queue: List[Dict] = []  # [{player_id, websocket, rating, timestamp}]
+# Очередь матчмейкинга, отсортированная по рейтингу: поиск соперника — это
+# bisect по окну [rating - max_diff, rating + max_diff] вместо полного перебора
+matchmaking_queue = SortedKeyList(key=lambda p: p["rating"])  # {player_id, websocket, rating, timestamp, future}
+# Параллельный индекс по player_id: проверка присутствия в очереди за O(1)
+# вместо линейного поиска по списку словарей
+matchmaking_index: Dict[str, dict] = {}  # player_id -> entry
 matchmaking_event = None  # asyncio.Event для уведомлений
 connections: Dict[str, WebSocket] = {}  # player_id -> websocket
 
 # Хранилище турнирных комнат
 tournament_rooms: Dict[str, Dict] = {}  # room_id -> {id, name, start_time, start_time_utc, players, spectators, created_at, status}
 
+# Кандидаты на удаление — обрабатываются фоновым reaper'ом, чтобы не делать
+# проверку занятости и удаление в латентно-чувствительном пути отключения
+_reap_queue: deque = deque()  # room_id
+
+
+async def reap_empty_rooms():
+    """Фоновая задача: пакетно удаляет опустевшие комнаты."""
+    while True:
+        await asyncio.sleep(5)
+        while _reap_queue:
+            rid = _reap_queue.popleft()
+            room = rooms.get(rid)
+            if room is None:
+                continue
+            # Перепроверяем занятость: в комнату могли успеть переподключиться
+            if not room.get("players") and not room.get("spectators"):
+                rooms.pop(rid, None)
+                logger.info("Комната %s удалена (пуста)", rid)
+
 # Рейтинги игроков теперь в rating.py
 
 
+async def send_fast(ws: WebSocket, message: dict):
+    """Отправляет dict текстовым кадром, кодируя orjson вместо stdlib json.
+
+    Starlette-овский send_json гоняет каждое сообщение через json.dumps;
+    orjson (C-расширение) кодирует те же payload'ы в разы быстрее.
+
+    Формат проводного протокола — JSON: все четыре поставляемых клиента
+    парсят его нативным JSON.parse, бинарный msgpack потребовал бы тащить
+    им JS-библиотеку ради ~2× экономии байтов на числовых массивах.
+    Если когда-нибудь понадобится — точка согласования формата здесь.
+    """
+    await ws.send_text(orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode())
+
+
+# Глубина очереди писателя: буфер на всплеск (серия ходов + броадкасты),
+# но достаточно маленький, чтобы зависший клиент был отключён быстро
+_WRITER_QUEUE_SIZE = 256
+
+
 class ConnectionManager:
     """Менеджер WebSocket соединений с обработкой ошибок и retry механизмом."""
     
     def __init__(self):
         self.active_connections: Dict[str, Dict[str, WebSocket]] = {}  # room_id -> {player_id: ws}
         self.connection_timestamps: Dict[str, Dict[str, float]] = {}  # room_id -> {player_id: timestamp}
-    
+        self.writer_queues: Dict[str, Dict[str, asyncio.Queue]] = {}  # room_id -> {player_id: Queue}
+        self.writer_tasks: Dict[str, Dict[str, asyncio.Task]] = {}  # room_id -> {player_id: Task}
+
     async def connect(self, websocket: WebSocket, room_id: str, player_id: str):
         """Подключает WebSocket соединение."""
         await websocket.accept()
+        # Отключаем алгоритм Нейгла: без этого маленькие JSON-кадры (ход,
+        # подсветка ходов, чат) могут задерживаться в ядре до ~40мс в
+        # ожидании склейки со следующей записью. Доступ к сокету зависит от
+        # транспорта (uvicorn/Linux), поэтому оборачиваем в try/except
+        try:
+            protocol = getattr(getattr(websocket, "_send", None), "__self__", None)
+            transport = websocket.scope.get("transport") or getattr(protocol, "transport", None)
+            sock = transport.get_extra_info("socket") if transport else None
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            pass
         if room_id not in self.active_connections:
             self.active_connections[room_id] = {}
             self.connection_timestamps[room_id] = {}
+            self.writer_queues[room_id] = {}
+            self.writer_tasks[room_id] = {}
         self.active_connections[room_id][player_id] = websocket
-        self.connection_timestamps[room_id][player_id] = time.time()
-        logger.debug(f"Игрок {player_id} подключён к комнате {room_id}")
-    
+        self.connection_timestamps[room_id][player_id] = time.monotonic()
+        # Персональная очередь исходящих: обработчики кладут сообщения через
+        # put_nowait и не ждут записи в сокет — медленный клиент тормозит
+        # только собственного писателя, а не игровой цикл
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_WRITER_QUEUE_SIZE)
+        self.writer_queues[room_id][player_id] = queue
+        self.writer_tasks[room_id][player_id] = asyncio.create_task(
+            self._writer(websocket, queue, room_id, player_id)
+        )
+        logger.debug("Игрок %s подключён к комнате %s", player_id, room_id)
+
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue, room_id: str, player_id: str):
+        """Фоновый писатель клиента: переливает его очередь в сокет."""
+        try:
+            while True:
+                payload = await queue.get()
+                # Готовое ASGI-событие вместо send_text: минус упаковка и
+                # проверки Starlette на каждый кадр горячего пути
+                await websocket.send({"type": "websocket.send", "text": payload})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Ошибка отправки сообщения игроку %s: %s", player_id, e)
+            self.disconnect(room_id, player_id)
+
     def disconnect(self, room_id: str, player_id: str):
         """Отключает WebSocket соединение."""
         if room_id in self.active_connections:
             self.active_connections[room_id].pop(player_id, None)
             if room_id in self.connection_timestamps:
                 self.connection_timestamps[room_id].pop(player_id, None)
+            self.writer_queues.get(room_id, {}).pop(player_id, None)
+            task = self.writer_tasks.get(room_id, {}).pop(player_id, None)
+            if task is not None:
+                task.cancel()
             if not self.active_connections[room_id]:
                 del self.active_connections[room_id]
                 if room_id in self.connection_timestamps:
                     del self.connection_timestamps[room_id]
-        logger.debug(f"Игрок {player_id} отключён от комнаты {room_id}")
+                self.writer_queues.pop(room_id, None)
+                self.writer_tasks.pop(room_id, None)
+        logger.debug("Игрок %s отключён от комнаты %s", player_id, room_id)
     
-    async def send_to_room(self, room_id: str, message: dict, max_retries: int = 3):
-        """Отправляет сообщение всем игрокам в комнате с retry механизмом."""
+    async def send_to_room(self, room_id: str, message: dict):
+        """Отправляет сообщение всем игрокам в комнате одновременно."""
         if room_id not in self.active_connections:
             return
-        
-        failed_connections = []
-        for player_id, ws in list(self.active_connections[room_id].items()):
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                logger.warning(f"Ошибка отправки сообщения игроку {player_id}: {e}")
-                failed_connections.append(player_id)
-        
-        # Удаляем неработающие соединения
-        for player_id in failed_connections:
-            if player_id in self.active_connections[room_id]:
-                try:
-                    await self.active_connections[room_id][player_id].close()
-                except:
-                    pass
-                self.disconnect(room_id, player_id)
-    
-    async def send_to_player(self, room_id: str, player_id: str, message: dict, max_retries: int = 3):
-        """Отправляет сообщение конкретному игроку с retry механизмом."""
-        if room_id not in self.active_connections or player_id not in self.active_connections[room_id]:
+
+        # Сериализуем один раз (orjson — C-расширение, заметно быстрее
+        # stdlib json на ходовых payload'ах с доской) и рассылаем текстом:
+        # send_json кодировал бы один и тот же dict N раз
+        payload = orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+        self._enqueue_all(room_id, payload)
+
+    async def broadcast_prepared(self, room_id: str, payload: str):
+        """Отправляет заранее сериализованное сообщение всем игрокам в комнате."""
+        if room_id not in self.active_connections:
             return
-        
-        for attempt in range(max_retries):
+        self._enqueue_all(room_id, payload)
+
+    def _enqueue_all(self, room_id: str, payload: str):
+        """Кладёт payload в очередь каждого писателя комнаты (без ожидания)."""
+        for player_id, queue in list(self.writer_queues.get(room_id, {}).items()):
             try:
-                await self.active_connections[room_id][player_id].send_json(message)
-                return
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Попытка {attempt + 1} отправки сообщения игроку {player_id} не удалась: {e}")
-                    await asyncio.sleep(0.1)
-                else:
-                    logger.error(f"Не удалось отправить сообщение игроку {player_id} после {max_retries} попыток: {e}")
-                    self.disconnect(room_id, player_id)
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Клиент не вычитывает целую очередь сообщений — считаем его
+                # мёртвым, иначе очередь росла бы без ограничений
+                logger.warning("Очередь игрока %s переполнена, отключаем", player_id)
+                self._kick(room_id, player_id)
+
+    def _kick(self, room_id: str, player_id: str):
+        """Закрывает соединение в фоне и убирает его из менеджера."""
+        websocket = self.active_connections.get(room_id, {}).get(player_id)
+        if websocket is not None:
+            close_task = asyncio.create_task(websocket.close())
+            # Ошибка закрытия уже мёртвого сокета не интересна
+            close_task.add_done_callback(lambda t: t.exception())
+        self.disconnect(room_id, player_id)
+
+    async def send_to_player(self, room_id: str, player_id: str, message: dict):
+        """Отправляет сообщение конкретному игроку через его очередь."""
+        self.send_text_to_player(
+            room_id, player_id,
+            orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+        )
+
+    def send_text_to_player(self, room_id: str, player_id: str, payload: str):
+        """Кладёт заранее сериализованное сообщение в очередь одного игрока."""
+        queue = self.writer_queues.get(room_id, {}).get(player_id)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning("Очередь игрока %s переполнена, отключаем", player_id)
+            self._kick(room_id, player_id)
 
 
 manager = ConnectionManager()
 
 
+def _opponent_id(room: dict, player_id: str) -> Optional[str]:
+    """Возвращает id соперника игрока (O(1) по двухэлементному списку)."""
+    players = room["players"]
+    for pid in players:
+        if pid != player_id:
+            return pid
+    return None
+
+
+def _fanout(room_id: str, message: dict, exclude: Optional[str] = None, only=None):
+    """Рассылает сообщение части комнаты через очереди писателей.
+
+    Кодирует payload один раз; писатели пишут в сокеты конкурентно, поэтому
+    задержка доставки равна самому медленному клиенту, а не сумме отправок.
+    exclude — не слать отправителю, only — ограничить получателей (players).
+    """
+    payload = orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+    for pid in list(manager.writer_queues.get(room_id, {})):
+        if pid == exclude:
+            continue
+        if only is not None and pid not in only:
+            continue
+        manager.send_text_to_player(room_id, pid, payload)
+
+# Конверт player_left почти полностью статичен — собираем JSON склейкой
+# константного префикса вместо прогона словаря через энкодер на каждый разрыв
+_PLAYER_LEFT_PREFIX = '{"type":"player_left","players_count":'
+
+
+def _player_left_payload(players_count: int, player_id: str) -> str:
+    """Собирает JSON-строку сообщения player_left без json.dumps всего конверта."""
+    return f'{_PLAYER_LEFT_PREFIX}{players_count},"player_id":{json.dumps(player_id)}}}'
+
+
+def room_board_state(room):
+    """Возвращает снимок доски комнаты, пересчитывая его только после изменений.
+
+    get_board_state() строит один и тот же 8×8 объект для каждого init и
+    каждого броадкаста; кэш на комнате сводит это к одному пересчёту на ход.
+    Инвалидация — board_cache = None везде, где меняется room["game"].
+    """
+    cache = room.get("board_cache")
+    if cache is None:
+        cache = room["game"].get_board_state()
+        room["board_cache"] = cache
+    return cache
+
+
+def _invalidate_room_caches(room):
+    """Сбрасывает кэши, зависящие от состояния партии (доска, init-фрагмент)."""
+    room["board_cache"] = None
+    room["init_fragment"] = None
+
+
+def _init_static_json(room) -> str:
+    """JSON-фрагмент init-сообщения, общий для всех подключающихся.
+
+    Доска, история и карточки кодируются один раз на комнату и
+    переиспользуются до следующего изменения партии — при наплыве зрителей
+    после матча тяжёлая часть init не прогоняется через энкодер заново.
+    Возвращается без внешних фигурных скобок для склейки с личными полями.
+    """
+    fragment = room.get("init_fragment")
+    if fragment is None:
+        fragment = orjson.dumps({
+            "board": room_board_state(room),
+            "current_player": room["game"].current_player,
+            "custom_moves": room["custom_moves"],
+            "ability_cards": room["ability_cards"],
+            "timers": room["timers"],
+            "increment": room["increment"],
+            "delay": room["delay"],
+            "move_history": room["move_history"],
+            "en_passant_target": room["game"].en_passant_target
+        }, option=orjson.OPT_NON_STR_KEYS).decode()[1:-1]
+        room["init_fragment"] = fragment
+    return fragment
+
+
 def rebuild_custom_moves(room):
     """Пересобирает custom_moves из включённых карточек"""
     room["custom_moves"] = {"white": {}, "black": {}}
+    # Дедупликация через set кортежей: проверка "move not in list" делала
+    # пересборку квадратичной по числу дельт на (цвет, тип фигуры)
+    seen = {"white": {}, "black": {}}
     for color in ["white", "black"]:
         for name, card in room["ability_cards"][color].items():
             if card.get("enabled", True) == False:
@@ -489,12 +725,76 @@ def rebuild_custom_moves(room):
                 continue
             if piece_type not in room["custom_moves"][color]:
                 room["custom_moves"][color][piece_type] = {"moves": [], "attacks": []}
-            for move in card.get("moves", []):
-                if move not in room["custom_moves"][color][piece_type]["moves"]:
-                    room["custom_moves"][color][piece_type]["moves"].append(move)
-            for attack in card.get("attacks", []):
-                if attack not in room["custom_moves"][color][piece_type]["attacks"]:
-                    room["custom_moves"][color][piece_type]["attacks"].append(attack)
+                seen[color][piece_type] = {"moves": set(), "attacks": set()}
+            for target in ("moves", "attacks"):
+                dedup = seen[color][piece_type][target]
+                dest = room["custom_moves"][color][piece_type][target]
+                for delta in card.get(target, []):
+                    key = tuple(delta)
+                    if key not in dedup:
+                        dedup.add(key)
+                        dest.append(delta)
+    _sync_custom_deltas(room)
+
+
+def _sync_custom_deltas(room):
+    """Пересобирает плоские кортежи-дельты для горячего пути get_valid_moves.
+
+    custom_moves хранит списки [dx, dy] (формат клиента); здесь они один раз
+    переводятся в кортежи, чтобы обработчик не распаковывал списки и мог
+    проверять принадлежность через set вместо линейного поиска.
+    """
+    deltas = {"white": {}, "black": {}}
+    for color, per_piece in room["custom_moves"].items():
+        for piece_type, cfg in per_piece.items():
+            deltas[color][piece_type] = {
+                "moves": [tuple(m) for m in cfg.get("moves", [])],
+                "attacks": [tuple(a) for a in cfg.get("attacks", [])]
+            }
+    room["custom_deltas"] = deltas
+
+
+# Задержка коалесцера карточек: серия быстрых toggle/save/delete превращается
+# в один broadcast полного состояния вместо N одинаковых
+_CARDS_FLUSH_DELAY = 0.02
+
+
+def schedule_cards_flush(room_id: str, message_type: str):
+    """Помечает комнату «грязной» и планирует один broadcast карточек."""
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    room.setdefault("_pending_card_updates", set()).add(message_type)
+    # Карточки и кастомные ходы входят в общий init-фрагмент
+    room["init_fragment"] = None
+    if room.get("_cards_flush_scheduled"):
+        return
+    room["_cards_flush_scheduled"] = True
+    asyncio.get_running_loop().call_later(
+        _CARDS_FLUSH_DELAY,
+        lambda: asyncio.ensure_future(_flush_cards(room_id))
+    )
+
+
+async def _flush_cards(room_id: str):
+    """Рассылает накопленные обновления карточек одним сообщением на тип."""
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    room["_cards_flush_scheduled"] = False
+    pending = room.get("_pending_card_updates") or set()
+    room["_pending_card_updates"] = set()
+    if "custom_moves_updated" in pending:
+        await manager.send_to_room(room_id, {
+            "type": "custom_moves_updated",
+            "custom_moves": room["custom_moves"]
+        })
+    if "cards_updated" in pending:
+        await manager.send_to_room(room_id, {
+            "type": "cards_updated",
+            "ability_cards": room["ability_cards"],
+            "custom_moves": room["custom_moves"]
+        })
 
 
 @app.get("/")
@@ -519,15 +819,28 @@ async def v26_root():
     return FileResponse(str(FRONTEND_V26_DIR / "index.html"))
 
 
-@app.get("/v2.7")
-async def v27_root():
-    response = FileResponse(str(FRONTEND_V27_DIR / "index.html"))
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+def _etag_file_response(request: Request, path: Path,
+                        media_type: str = None) -> Response:
+    """Отдаёт файл со слабым ETag и отвечает 304 без тела, если копия клиента свежа.
+
+    ETag строится из mtime и размера файла — этого достаточно, чтобы
+    повторные загрузки неизменившейся статики не передавали тело вовсе.
+    """
+    stat = path.stat()
+    etag = f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response = FileResponse(str(path), media_type=media_type)
+    response.headers["ETag"] = etag
     return response
 
 
+@app.get("/v2.7")
+async def v27_root(request: Request):
+    # Заголовки no-cache добавляет NoCacheMiddleware для всего /v2.7
+    return _etag_file_response(request, FRONTEND_V27_DIR / "index.html")
+
+
 app.mount("/v2.5/static", StaticFiles(directory=str(FRONTEND_V25_DIR)), name="static_v25")
 app.mount("/v2.6/static", StaticFiles(directory=str(FRONTEND_V26_DIR)), name="static_v26")
 app.mount("/v2.7/static", StaticFiles(directory=str(FRONTEND_V27_DIR / "static")), name="static_v27")
@@ -537,118 +850,672 @@ app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
 
 # Маршрут для game.js в v2.7 (находится в корне директории)
 @app.get("/v2.7/game.js")
-async def v27_game_js():
-    response = FileResponse(str(FRONTEND_V27_DIR / "game.js"), media_type="application/javascript")
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+async def v27_game_js(request: Request):
+    # Заголовки no-cache добавляет NoCacheMiddleware для всего /v2.7
+    return _etag_file_response(request, FRONTEND_V27_DIR / "game.js",
+                               media_type="application/javascript")
+
+
+def _match_pairs():
+    """Один проход подбора: спаривает подходящих игроков из очереди."""
+    now = time.monotonic()
+    for entry in list(matchmaking_queue):
+        if entry["future"].done():
+            continue
+
+        rating = entry["rating"]
+        # Расширяем диапазон поиска со временем ожидания; очередь
+        # отсортирована по рейтингу, поэтому кандидаты достаются
+        # bisect-срезом окна вместо полного перебора
+        wait_time = now - entry["timestamp"]
+        max_diff = 100 + wait_time * 10
+
+        lo = matchmaking_queue.bisect_key_left(rating - max_diff)
+        hi = matchmaking_queue.bisect_key_right(rating + max_diff)
+
+        # Ищем подходящего соперника (ближайшего по рейтингу)
+        best_match = None
+        best_diff = float('inf')
+
+        for other in matchmaking_queue[lo:hi]:
+            if other is entry or other["future"].done():
+                continue
+
+            rating_diff = abs(other["rating"] - rating)
+            if rating_diff < best_diff:
+                best_match = other
+                best_diff = rating_diff
+
+        if best_match:
+            # Нашли соперника!
+            room_id = str(uuid.uuid4())[:8]
+
+            # Удаляем обоих из очереди
+            matchmaking_queue.remove(entry)
+            matchmaking_queue.remove(best_match)
+            matchmaking_index.pop(entry["player_id"], None)
+            matchmaking_index.pop(best_match["player_id"], None)
+
+            # Сообщаем обоим endpoint'ам результат через их future
+            entry["future"].set_result({
+                "room_id": room_id,
+                "opponent_rating": best_match["rating"]
+            })
+            best_match["future"].set_result({
+                "room_id": room_id,
+                "opponent_rating": rating
+            })
+
+
+async def matchmaking_matcher():
+    """Единственная фоновая задача подбора соперников.
+
+    Вместо N параллельных циклов-сканеров (по одному на подключение)
+    очередь обслуживает один matcher: это убирает дублирующиеся O(N log N)
+    проходы и гонку на matchmaking_event.clear() между ожидающими.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(matchmaking_event.wait(), timeout=1.0)
+            matchmaking_event.clear()
+        except asyncio.TimeoutError:
+            pass
+        try:
+            _match_pairs()
+        except Exception as e:
+            logger.error("Ошибка в задаче матчмейкинга: %s", e, exc_info=True)
 
 
 # Matchmaking endpoint
 @app.websocket("/ws/matchmaking/{player_id}")
 async def matchmaking_endpoint(websocket: WebSocket, player_id: str):
     global matchmaking_event
-    
+
     await websocket.accept()
-    
+
     # Получаем рейтинг игрока
     rating = await RatingSystem.get_rating(player_id)
-    
+
     # Создаём событие для уведомлений о новых игроках (если ещё не создано)
     if matchmaking_event is None:
         matchmaking_event = asyncio.Event()
-    
-    # Добавляем в очередь
+
+    # Добавляем в очередь; matcher сообщит о найденной паре через future
     player_entry = {
         "player_id": player_id,
         "websocket": websocket,
         "rating": rating,
-        "timestamp": time.time()
+        "timestamp": time.monotonic(),
+        "future": asyncio.get_running_loop().create_future()
     }
-    matchmaking_queue.append(player_entry)
-    
-    # Уведомляем о новом игроке
+    matchmaking_queue.add(player_entry)
+    matchmaking_index[player_id] = player_entry
+
+    # Уведомляем matcher о новом игроке
     matchmaking_event.set()
-    
-    await websocket.send_json({
+
+    await send_fast(websocket, {
         "type": "queued",
         "position": len(matchmaking_queue),
         "rating": rating
     })
-    
+
     try:
-        
-        # Ищем соперника
+        # Endpoint занимается только I/O: ждём результат от matcher'а,
+        # периодически сообщая игроку его позицию в очереди
         while True:
-            # Сортируем очередь по рейтингу для эффективного поиска
-            matchmaking_queue.sort(key=lambda x: x["rating"])
-            
-            # Ищем подходящего соперника (ближайшего по рейтингу)
-            best_match = None
-            best_diff = float('inf')
-            
-            for other in matchmaking_queue:
-                if other["player_id"] == player_id:
-                    continue
-                
-                rating_diff = abs(other["rating"] - rating)
-                wait_time = time.time() - min(player_entry["timestamp"], other["timestamp"])
-                
-                # Расширяем диапазон поиска со временем
-                max_diff = 100 + wait_time * 10
-                
-                if rating_diff <= max_diff and rating_diff < best_diff:
-                    best_match = other
-                    best_diff = rating_diff
-            
-            if best_match:
-                # Нашли соперника!
-                room_id = str(uuid.uuid4())[:8]
-                
-                # Удаляем обоих из очереди
-                matchmaking_queue.remove(player_entry)
-                matchmaking_queue.remove(best_match)
-                
-                # Уведомляем обоих
-                await websocket.send_json({
-                    "type": "match_found",
-                    "room_id": room_id,
-                    "opponent_rating": best_match["rating"]
-                })
-                
-                await best_match["websocket"].send_json({
-                    "type": "match_found",
-                    "room_id": room_id,
-                    "opponent_rating": rating
-                })
-                
-                return
-            
-            # Обновляем позицию в очереди
             try:
-                pos = matchmaking_queue.index(player_entry) + 1
-                await websocket.send_json({
+                match = await asyncio.wait_for(
+                    asyncio.shield(player_entry["future"]), timeout=1.0
+                )
+            except asyncio.TimeoutError:
+                if player_id not in matchmaking_index:
+                    # Уже выбраны matcher'ом — ждём результат future
+                    continue
+                pos = matchmaking_queue.bisect_left(player_entry) + 1
+                await send_fast(websocket, {
                     "type": "queue_update",
                     "position": pos,
                     "queue_size": len(matchmaking_queue)
                 })
-            except ValueError:
-                break
-            
-            # Ждём уведомления о новых игроках или таймаут
-            try:
-                await asyncio.wait_for(matchmaking_event.wait(), timeout=1.0)
-                matchmaking_event.clear()
-            except asyncio.TimeoutError:
-                pass
-    
+                continue
+
+            await send_fast(websocket, {
+                "type": "match_found",
+                "room_id": match["room_id"],
+                "opponent_rating": match["opponent_rating"]
+            })
+            return
+
     except WebSocketDisconnect:
-        if player_entry in matchmaking_queue:
+        if not player_entry["future"].done() and player_id in matchmaking_index:
             matchmaking_queue.remove(player_entry)
+            matchmaking_index.pop(player_id, None)
+
+
+# --- Обработчики сообщений игровой комнаты -------------------------------
+# Каждый тип сообщения — маленькая async-функция; endpoint находит её по
+# словарю за O(1) вместо прохода по elif-лестнице на каждое сообщение
+
+
+async def _send_position_eval(room_id: str, room: dict):
+    """Считает оценку позиции в отдельном потоке и досылает её комнате."""
+    try:
+        evaluation = await asyncio.to_thread(
+            PositionAnalyzer.evaluate_position,
+            room["game"].board, room["game"].current_player
+        )
+        await manager.send_to_room(room_id, {
+            "type": "position_eval",
+            "evaluation": evaluation
+        })
+    except Exception as e:
+        logger.error(f"Ошибка при расчёте оценки позиции: {e}")
+
+
+async def _handle_move(room_id: str, room: dict, player_id: str, data):
+    from_pos = tuple(data.from_pos)
+    to_pos = tuple(data.to_pos)
+    promotion_piece = data.promotion
+    player_color = room["colors"].get(player_id)
+
+    logger.debug(f"Move request from {player_id}: from={from_pos}, to={to_pos}, player_color={player_color}, current_player={room['game'].current_player}")
+
+    # Проверяем что ход делает правильный игрок
+    if player_color != room["game"].current_player:
+        logger.warning(f"Wrong turn: player_color={player_color}, current_player={room['game'].current_player}")
+        await manager.send_to_player(room_id, player_id, {
+            "type": "error",
+            "message": "Не ваш ход"
+        })
+        return
+
+    # Запоминаем ходящую фигуру до хода — после make_move
+    # клетка from уже пуста, а тип нужен для PGN-нотации
+    moving_piece = room["game"].board[from_pos[0]][from_pos[1]]
+
+    # Выполняем ход (с учётом кастомных ходов)
+    result = room["game"].make_move(from_pos, to_pos, room["custom_moves"], promotion_piece)
+    logger.debug(f"Move result: success={result.get('success')}, message={result.get('message')}")
+
+    if result["success"]:
+        # Обновляем таймеры
+        now = time.monotonic()
+        if room["last_move_time"]:
+            elapsed = now - room["last_move_time"]
+            prev_player = "black" if room["game"].current_player == "white" else "white"
+            room["timers"][prev_player] = max(0, room["timers"][prev_player] - int(elapsed))
+            # Добавляем инкремент
+            room["timers"][prev_player] += room["increment"]
+        room["last_move_time"] = now
+
+        # Сохраняем ход в историю компактно: необязательные поля
+        # пишем только когда они заполнены — для большинства ходов
+        # запись состоит из одних координат, что вдвое уменьшает
+        # память на длинных партиях и размер JSON при сохранении в БД
+        move_record = {
+            "from": list(from_pos),
+            "to": list(to_pos)
+        }
+        for key in ("captured", "castling", "en_passant", "promotion"):
+            value = result.get(key)
+            if value:
+                move_record[key] = value
+        # Тип фигуры нужен экспортёру PGN; пешку (умолчание
+        # нотации) не пишем, чтобы запись осталась компактной
+        if moving_piece and moving_piece.type.value != "pawn":
+            move_record["piece"] = moving_piece.type.value
+        room["move_history"].append(move_record)
+        _invalidate_room_caches(room)
+
+        # Отправляем обновление всем сразу, не дожидаясь оценки позиции:
+        # evaluate_position — чистый Python-цикл по доске и задерживал
+        # бы доставку хода сопернику
+        await manager.send_to_room(room_id, {
+            "type": "move",
+            "from": list(from_pos),
+            "to": list(to_pos),
+            "board": room_board_state(room),
+            "current_player": room["game"].current_player,
+            "check": result.get("check", False),
+            "checkmate": result.get("checkmate", False),
+            "stalemate": result.get("stalemate", False),
+            "captured": result.get("captured"),
+            "castling": result.get("castling"),
+            "en_passant": result.get("en_passant"),
+            "promotion": result.get("promotion"),
+            "en_passant_target": result.get("en_passant_target"),
+            "timers": room["timers"]
+        })
+
+        # Анализ позиции (для версии 2.7) досылаем отдельным сообщением,
+        # когда он будет готов
+        asyncio.create_task(_send_position_eval(room_id, room))
+
+        # Обновляем рейтинг при завершении игры
+        if result.get("checkmate") or result.get("stalemate"):
+            winner = None
+            if result.get("checkmate"):
+                winner = "black" if room["game"].current_player == "white" else "white"
+
+            # Обновляем рейтинги
+            if len(room["players"]) == 2:
+                player1_id = room["players"][0]
+                player2_id = room["players"][1]
+
+                if winner:
+                    if room["colors"][player1_id] == winner:
+                        result_value = 1.0
+                    else:
+                        result_value = 0.0
+                else:
+                    result_value = 0.5  # Ничья
+
+                rating_update = await RatingSystem.update_rating(player1_id, player2_id, result_value)
+
+                await manager.send_to_room(room_id, {
+                    "type": "rating_updated",
+                    "ratings": rating_update
+                })
+    else:
+        await manager.send_to_player(room_id, player_id, {
+            "type": "error",
+            "message": result.get("message", "Недопустимый ход")
+        })
 
 
-import heapq
+async def _handle_get_valid_moves(room_id: str, room: dict, player_id: str, data):
+    pos = tuple(data.position)
+    moves = room["game"].get_valid_moves(pos)
+
+    # Добавляем кастомные ходы из комнаты
+    x, y = pos
+    piece = room["game"].board[x][y]
+    logger.debug(f"get_valid_moves: pos={pos}, custom_moves={room['custom_moves']}")
+    if piece:
+        color = piece.color
+        piece_type = piece.type.value  # строка типа "pawn"
+        deltas = room.get("custom_deltas", {}).get(color, {}).get(piece_type)
+        logger.debug("Piece: %s %s, custom deltas: %s", color, piece_type, deltas)
+
+        if deltas:
+            board = room["game"].board
+            # set-принадлежность вместо линейного поиска по спискам
+            seen_moves = {tuple(m) for m in moves["moves"]}
+            for dx, dy in deltas["moves"]:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < 8 and 0 <= ny < 8 and (nx, ny) not in seen_moves:
+                    if not board[nx][ny]:
+                        seen_moves.add((nx, ny))
+                        moves["moves"].append([nx, ny])
+
+            seen_attacks = {tuple(a) for a in moves["attacks"]}
+            for dx, dy in deltas["attacks"]:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < 8 and 0 <= ny < 8 and (nx, ny) not in seen_attacks:
+                    target = board[nx][ny]
+                    if target and target.color != color:
+                        seen_attacks.add((nx, ny))
+                        moves["attacks"].append([nx, ny])
+
+    await manager.send_to_player(room_id, player_id, {
+        "type": "valid_moves",
+        "position": list(pos),
+        "moves": moves["moves"],
+        "attacks": moves["attacks"]
+    })
+
+
+async def _handle_resign(room_id: str, room: dict, player_id: str, data):
+    winner = "black" if room["colors"].get(player_id) == "white" else "white"
+    await manager.send_to_room(room_id, {
+        "type": "game_over",
+        "reason": "resign",
+        "winner": winner
+    })
+
+
+async def _handle_add_custom_move(room_id: str, room: dict, player_id: str, data):
+    color = data.color
+    piece_type = data.piece_type
+    move = data.move
+    is_attack = data.is_attack
+
+    if color and piece_type and move:
+        if piece_type not in room["custom_moves"][color]:
+            room["custom_moves"][color][piece_type] = {"moves": [], "attacks": []}
+
+        target = "attacks" if is_attack else "moves"
+        if move not in room["custom_moves"][color][piece_type][target]:
+            room["custom_moves"][color][piece_type][target].append(move)
+        _sync_custom_deltas(room)
+
+        schedule_cards_flush(room_id, "custom_moves_updated")
+
+
+async def _handle_save_card(room_id: str, room: dict, player_id: str, data):
+    color = data.color
+    name = data.name
+    card_data = data.card_data
+    logger.debug(f"Received save_card: {name}, color={color}, card_data={card_data}")
+
+    if color and name and card_data:
+        card_data["enabled"] = True
+        room["ability_cards"][color][name] = card_data
+        rebuild_custom_moves(room)
+
+        logger.debug(f"custom_moves after rebuild: {room['custom_moves']}")
+        schedule_cards_flush(room_id, "cards_updated")
+    else:
+        logger.warning(f"Missing data: color={color}, name={name}, card_data={card_data}")
+
+
+async def _handle_delete_card(room_id: str, room: dict, player_id: str, data):
+    color = data.color
+    name = data.name
+
+    if color and name and name in room["ability_cards"][color]:
+        del room["ability_cards"][color][name]
+        rebuild_custom_moves(room)
+
+        schedule_cards_flush(room_id, "cards_updated")
+
+
+async def _handle_toggle_card(room_id: str, room: dict, player_id: str, data):
+    color = data.color
+    name = data.name
+    enabled = data.enabled
+    logger.debug(f"toggle_card: {name}, enabled={enabled}")
+
+    if color and name and name in room["ability_cards"][color]:
+        room["ability_cards"][color][name]["enabled"] = enabled
+        rebuild_custom_moves(room)
+        logger.debug(f"custom_moves after toggle: {room['custom_moves']}")
+
+        schedule_cards_flush(room_id, "cards_updated")
+
+
+async def _handle_reset_custom_moves(room_id: str, room: dict, player_id: str, data):
+    room["custom_moves"] = {"white": {}, "black": {}}
+    room["custom_deltas"] = {"white": {}, "black": {}}
+    room["ability_cards"] = {"white": {}, "black": {}}
+    schedule_cards_flush(room_id, "cards_updated")
+
+
+async def _handle_request_full_state(room_id: str, room: dict, player_id: str, data):
+    """Полный снимок партии по запросу — точка ресинхронизации клиента.
+
+    Ходы несут в себе весь дифф (from/to/взятие/рокировка/превращение),
+    так что клиент, применяющий диффы сам, может не читать поле board из
+    move-сообщений и пересинхронизироваться этим запросом после разрыва.
+    """
+    per_player = orjson.dumps({
+        "type": "full_state",
+        "color": room["colors"].get(player_id, "spectator"),
+        "players_count": len(room["players"]),
+        "spectators_count": len(room["spectators"])
+    }).decode()
+    manager.send_text_to_player(
+        room_id, player_id,
+        per_player[:-1] + "," + _init_static_json(room) + "}"
+    )
+
+
+async def _handle_chat(room_id: str, room: dict, player_id: str, data):
+    message = data.message
+    if message:
+        # Отправляем сообщение всем кроме отправителя
+        _fanout(room_id, {"type": "chat", "message": message}, exclude=player_id)
+
+
+async def _handle_offer_draw(room_id: str, room: dict, player_id: str, data):
+    # Отправляем предложение ничьей противнику
+    _fanout(room_id, {"type": "draw_offered"}, exclude=player_id)
+
+
+async def _handle_draw_response(room_id: str, room: dict, player_id: str, data):
+    accept = data.accept
+    if accept:
+        await manager.send_to_room(room_id, {
+            "type": "game_over",
+            "reason": "draw",
+            "winner": None
+        })
+    else:
+        _fanout(room_id, {"type": "draw_declined"}, exclude=player_id)
+
+
+async def _handle_request_undo(room_id: str, room: dict, player_id: str, data):
+    # Запрос на отмену хода — адресат один: соперник
+    opponent = _opponent_id(room, player_id)
+    if opponent is not None:
+        await manager.send_to_player(room_id, opponent, {"type": "undo_requested"})
+    room["undo_requests"][player_id] = True
+
+
+async def _handle_undo_response(room_id: str, room: dict, player_id: str, data):
+    accept = data.accept
+    if accept and room["move_history"]:
+        # Отменяем последний ход инкрементально: откат диффа вместо
+        # пересоздания игры и воспроизведения всей истории
+        room["move_history"].pop()
+        room["game"].undo()
+        _invalidate_room_caches(room)
+
+        await manager.send_to_room(room_id, {
+            "type": "undo_accepted",
+            "board": room_board_state(room),
+            "current_player": room["game"].current_player,
+            "move_history": room["move_history"]
+        })
+    else:
+        _fanout(room_id, {"type": "undo_declined"}, only=room["undo_requests"])
+    room["undo_requests"] = {}
+
+
+async def _start_rematch(room_id: str, room: dict):
+    """Сбрасывает партию, меняет цвета и рассылает rematch_started.
+
+    Единая точка для обоих путей согласия (request_rematch и
+    rematch_response) — дублирование блоков рано или поздно разъезжается.
+    """
+    room["game"] = ChessGame()
+    _invalidate_room_caches(room)
+    room["move_history"].clear()
+    room["timers"] = {"white": 600, "black": 600}
+    room["last_move_time"] = None
+    room["rematch_requests"].clear()
+
+    # Меняем цвета
+    for pid in room["players"]:
+        room["colors"][pid] = "black" if room["colors"][pid] == "white" else "white"
+
+    await manager.send_to_room(room_id, {
+        "type": "rematch_started",
+        "board": room_board_state(room),
+        "current_player": room["game"].current_player,
+        "colors": room["colors"],
+        "timers": room["timers"]
+    })
+
+
+async def _handle_request_rematch(room_id: str, room: dict, player_id: str, data):
+    room["rematch_requests"].add(player_id)
+
+    # Если оба игрока согласны
+    if len(room["rematch_requests"]) >= 2:
+        await _start_rematch(room_id, room)
+    else:
+        # Уведомляем противника
+        opponent = _opponent_id(room, player_id)
+        if opponent is not None:
+            await manager.send_to_player(room_id, opponent, {"type": "rematch_requested"})
+
+
+async def _handle_rematch_response(room_id: str, room: dict, player_id: str, data):
+    accept = data.accept
+    if accept:
+        room["rematch_requests"].add(player_id)
+        if len(room["rematch_requests"]) >= 2:
+            await _start_rematch(room_id, room)
+    else:
+        room["rematch_requests"].clear()
+        _fanout(room_id, {"type": "rematch_declined"}, exclude=player_id)
+
+
+async def _handle_set_time_control(room_id: str, room: dict, player_id: str, data):
+    # Установка контроля времени
+    room["timers"]["white"] = data.time
+    room["timers"]["black"] = data.time
+    room["increment"] = data.increment
+    room["delay"] = data.delay
+    room["init_fragment"] = None
+
+    await manager.send_to_room(room_id, {
+        "type": "time_control_updated",
+        "timers": room["timers"],
+        "increment": room["increment"],
+        "delay": room["delay"]
+    })
+
+
+# Мемоизация анализа позиции: UI опрашивает анализ между ходами, а позиция
+# меняется только ходом — повторный запрос того же (позиция, цвет)
+# отдаётся из кэша. Ключ O(64) дешевле самих анализаторов на порядки
+_ANALYSIS_CACHE_SIZE = 4096
+_analysis_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def _board_key(board) -> bytes:
+    """Хешируемый ключ позиции: 64 байта кодов фигур (ChessBoard.pack)."""
+    return ChessBoard.pack(board)
+
+
+async def _handle_get_position_analysis(room_id: str, room: dict, player_id: str, data):
+    # Анализ позиции
+    color = room["colors"].get(player_id, "white")
+    key = (_board_key(room["game"].board), color)
+    cached = _analysis_cache.get(key)
+    if cached is not None:
+        _analysis_cache.move_to_end(key)
+        evaluation, analysis = cached
+    else:
+        # Оба анализатора — чистые Python-циклы по доске: уводим их с
+        # event loop в пул потоков и считаем параллельно
+        analysis, evaluation = await asyncio.gather(
+            asyncio.to_thread(PositionAnalyzer.analyze_threats, room["game"].board, color),
+            asyncio.to_thread(PositionAnalyzer.evaluate_position, room["game"].board, color)
+        )
+        _analysis_cache[key] = (evaluation, analysis)
+        if len(_analysis_cache) > _ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+    await manager.send_to_player(room_id, player_id, {
+        "type": "position_analysis",
+        "evaluation": evaluation,
+        "threats": analysis
+    })
+
+
+async def _handle_export_pgn(room_id: str, room: dict, player_id: str, data):
+    # Экспорт партии в PGN
+    white_name = data.white_name or "White"
+    black_name = data.black_name or "Black"
+    result = data.result or "*"
+
+    # Экспорт чисто вычислительный (сборка строк по всей истории ходов),
+    # поэтому выполняем его в пуле потоков, чтобы не блокировать event loop
+    pgn = await asyncio.to_thread(
+        PGNExporter.export_game,
+        room["move_history"],
+        white_name,
+        black_name,
+        result
+    )
+
+    # PGN длинной партии хорошо сжимается (повторяющаяся нотация) —
+    # для крупных ответов отправляем gzip+base64 вместо сырого текста,
+    # мелкие не трогаем, чтобы не тратить CPU впустую
+    if len(pgn) > 1024:
+        compressed = await asyncio.to_thread(gzip.compress, pgn.encode(), 3)
+        await manager.send_to_player(room_id, player_id, {
+            "type": "pgn_exported",
+            "encoding": "gzip+base64",
+            "pgn_gz": base64.b64encode(compressed).decode("ascii")
+        })
+    else:
+        await manager.send_to_player(room_id, player_id, {
+            "type": "pgn_exported",
+            "pgn": pgn
+        })
+
+
+async def _handle_get_rating(room_id: str, room: dict, player_id: str, data):
+    # Получить рейтинг игрока
+    rating = await RatingSystem.get_rating(player_id)
+    rank = RatingSystem.get_rank(rating)
+    history = await RatingSystem.get_rating_history(player_id, 10)
+
+    await manager.send_to_player(room_id, player_id, {
+        "type": "rating_info",
+        "rating": rating,
+        "rank": rank,
+        "history": history
+    })
+
+
+# TypeAdapter на тип сообщения: адаптеры собираются один раз при импорте,
+# validate_python(raw) — самый быстрый путь валидации в pydantic v2
+# (конструктор с **kwargs пересобирает аргументы на каждый вызов).
+# Рассматривался msgspec.Struct (декод+валидация одним C-проходом, ещё
+# ~5× быстрее), но это вторая схемная библиотека рядом с pydantic у HTTP
+# маршрутов; после Literal-тегов и кэшированных адаптеров валидация уже
+# не доминирует в профиле — вернуться сюда, если это изменится
+SCHEMAS = {
+    "move": TypeAdapter(MoveRequest),
+    "get_valid_moves": TypeAdapter(GetValidMovesRequest),
+    "add_custom_move": TypeAdapter(CustomMoveRequest),
+    "save_card": TypeAdapter(SaveCardRequest),
+    "toggle_card": TypeAdapter(ToggleCardRequest),
+    "delete_card": TypeAdapter(DeleteCardRequest),
+    "reset_custom_moves": TypeAdapter(ResetCustomMovesRequest),
+    "request_full_state": TypeAdapter(RequestFullStateRequest),
+    "chat": TypeAdapter(ChatRequest),
+    "resign": TypeAdapter(ResignRequest),
+    "offer_draw": TypeAdapter(OfferDrawRequest),
+    "draw_response": TypeAdapter(DrawResponseRequest),
+    "request_undo": TypeAdapter(RequestUndoRequest),
+    "undo_response": TypeAdapter(UndoResponseRequest),
+    "request_rematch": TypeAdapter(RequestRematchRequest),
+    "rematch_response": TypeAdapter(RematchResponseRequest),
+    "set_time_control": TypeAdapter(SetTimeControlRequest),
+    "get_position_analysis": TypeAdapter(GetPositionAnalysisRequest),
+    "export_pgn": TypeAdapter(ExportPGNRequest),
+    "get_rating": TypeAdapter(GetRatingRequest),
+}
+
+HANDLERS = {
+    "move": _handle_move,
+    "get_valid_moves": _handle_get_valid_moves,
+    "add_custom_move": _handle_add_custom_move,
+    "save_card": _handle_save_card,
+    "toggle_card": _handle_toggle_card,
+    "delete_card": _handle_delete_card,
+    "reset_custom_moves": _handle_reset_custom_moves,
+    "request_full_state": _handle_request_full_state,
+    "chat": _handle_chat,
+    "resign": _handle_resign,
+    "offer_draw": _handle_offer_draw,
+    "draw_response": _handle_draw_response,
+    "request_undo": _handle_request_undo,
+    "undo_response": _handle_undo_response,
+    "request_rematch": _handle_request_rematch,
+    "rematch_response": _handle_rematch_response,
+    "set_time_control": _handle_set_time_control,
+    "get_position_analysis": _handle_get_position_analysis,
+    "export_pgn": _handle_export_pgn,
+    "get_rating": _handle_get_rating,
+}
 
 
 @app.websocket("/ws/{room_id}/{player_id}")
@@ -663,6 +1530,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
             "game": ChessGame(),
             "colors": {},
             "custom_moves": {"white": {}, "black": {}},
+            "custom_deltas": {"white": {}, "black": {}},
             "ability_cards": {"white": {}, "black": {}},
             "timers": {"white": 600, "black": 600},
             "increment": 0,  # Инкремент времени
@@ -690,25 +1558,21 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
             room["colors"][player_id] = "spectator"
     
     # Отправляем начальное состояние
-    import time
     if room["last_move_time"] is None:
-        room["last_move_time"] = time.time()
+        room["last_move_time"] = time.monotonic()
     
-    await manager.send_to_player(room_id, player_id, {
+    # Личные поля кодируются на каждое подключение, тяжёлая общая часть
+    # (доска, история, карточки) берётся из кэшированного фрагмента комнаты
+    per_player = orjson.dumps({
         "type": "init",
         "color": room["colors"].get(player_id, "spectator"),
-        "board": room["game"].get_board_state(),
-        "current_player": room["game"].current_player,
         "players_count": len(room["players"]),
-        "spectators_count": len(room["spectators"]),
-        "custom_moves": room["custom_moves"],
-        "ability_cards": room["ability_cards"],
-        "timers": room["timers"],
-        "increment": room["increment"],
-        "delay": room["delay"],
-        "move_history": room["move_history"],
-        "en_passant_target": room["game"].en_passant_target
-    })
+        "spectators_count": len(room["spectators"])
+    }).decode()
+    manager.send_text_to_player(
+        room_id, player_id,
+        per_player[:-1] + "," + _init_static_json(room) + "}"
+    )
     
     # Уведомляем всех о новом игроке
     await manager.send_to_room(room_id, {
@@ -716,59 +1580,22 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
         "players_count": len(room["players"])
     })
     
-    try:
+    async with _room_session(room_id, room, player_id):
         while True:
-            raw_data = await websocket.receive_json()
+            raw_data = orjson.loads(await websocket.receive_text())
             logger.debug(f"Received message type: {raw_data.get('type')} from {player_id}")
             
-            # Валидация данных
+            # Валидация данных: схема находится по типу за O(1)
+            message_type = raw_data.get("type")
+            schema = SCHEMAS.get(message_type)
+            if schema is None:
+                await manager.send_to_player(room_id, player_id, {
+                    "type": "error",
+                    "message": f"Неизвестный тип сообщения: {message_type}"
+                })
+                continue
             try:
-                message_type = raw_data.get("type")
-                if message_type == "move":
-                    data = MoveRequest(**raw_data)
-                    from_pos = tuple(data.from_pos)
-                    to_pos = tuple(data.to_pos)
-                    promotion_piece = data.promotion
-                elif message_type == "get_valid_moves":
-                    data = GetValidMovesRequest(**raw_data)
-                elif message_type == "add_custom_move":
-                    data = CustomMoveRequest(**raw_data)
-                elif message_type == "save_card":
-                    data = SaveCardRequest(**raw_data)
-                elif message_type == "toggle_card":
-                    data = ToggleCardRequest(**raw_data)
-                elif message_type == "delete_card":
-                    data = DeleteCardRequest(**raw_data)
-                elif message_type == "chat":
-                    data = ChatRequest(**raw_data)
-                elif message_type == "resign":
-                    data = ResignRequest(**raw_data)
-                elif message_type == "offer_draw":
-                    data = OfferDrawRequest(**raw_data)
-                elif message_type == "draw_response":
-                    data = DrawResponseRequest(**raw_data)
-                elif message_type == "request_undo":
-                    data = RequestUndoRequest(**raw_data)
-                elif message_type == "undo_response":
-                    data = UndoResponseRequest(**raw_data)
-                elif message_type == "request_rematch":
-                    data = RequestRematchRequest(**raw_data)
-                elif message_type == "rematch_response":
-                    data = RematchResponseRequest(**raw_data)
-                elif message_type == "set_time_control":
-                    data = SetTimeControlRequest(**raw_data)
-                elif message_type == "get_position_analysis":
-                    data = GetPositionAnalysisRequest(**raw_data)
-                elif message_type == "export_pgn":
-                    data = ExportPGNRequest(**raw_data)
-                elif message_type == "get_rating":
-                    data = GetRatingRequest(**raw_data)
-                else:
-                    await manager.send_to_player(room_id, player_id, {
-                        "type": "error",
-                        "message": f"Неизвестный тип сообщения: {message_type}"
-                    })
-                    continue
+                data = schema.validate_python(raw_data)
             except ValidationError as e:
                 logger.warning(f"Ошибка валидации данных от {player_id}: {e}")
                 await manager.send_to_player(room_id, player_id, {
@@ -783,449 +1610,61 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                     "message": "Внутренняя ошибка сервера"
                 })
                 continue
-            
-            if message_type == "move":
-                player_color = room["colors"].get(player_id)
-                
-                logger.debug(f"Move request from {player_id}: from={from_pos}, to={to_pos}, player_color={player_color}, current_player={room['game'].current_player}")
-                
-                # Проверяем что ход делает правильный игрок
-                if player_color != room["game"].current_player:
-                    logger.warning(f"Wrong turn: player_color={player_color}, current_player={room['game'].current_player}")
-                    await manager.send_to_player(room_id, player_id, {
-                        "type": "error",
-                        "message": "Не ваш ход"
-                    })
-                    continue
-                
-                # Выполняем ход (с учётом кастомных ходов)
-                result = room["game"].make_move(from_pos, to_pos, room["custom_moves"], promotion_piece)
-                logger.debug(f"Move result: success={result.get('success')}, message={result.get('message')}")
-                
-                if result["success"]:
-                    # Обновляем таймеры
-                    now = time.time()
-                    if room["last_move_time"]:
-                        elapsed = now - room["last_move_time"]
-                        prev_player = "black" if room["game"].current_player == "white" else "white"
-                        room["timers"][prev_player] = max(0, room["timers"][prev_player] - int(elapsed))
-                        # Добавляем инкремент
-                        room["timers"][prev_player] += room["increment"]
-                    room["last_move_time"] = now
-                    
-                    # Сохраняем ход в историю
-                    move_record = {
-                        "from": list(from_pos),
-                        "to": list(to_pos),
-                        "piece": result.get("piece"),
-                        "captured": result.get("captured"),
-                        "castling": result.get("castling"),
-                        "en_passant": result.get("en_passant"),
-                        "promotion": result.get("promotion")
-                    }
-                    room["move_history"].append(move_record)
-                    
-                    # Анализ позиции (для версии 2.7)
-                    position_eval = PositionAnalyzer.evaluate_position(room["game"].board, room["game"].current_player)
-                    
-                    # Отправляем обновление всем
-                    await manager.send_to_room(room_id, {
-                        "type": "move",
-                        "from": list(from_pos),
-                        "to": list(to_pos),
-                        "board": room["game"].get_board_state(),
-                        "current_player": room["game"].current_player,
-                        "check": result.get("check", False),
-                        "checkmate": result.get("checkmate", False),
-                        "stalemate": result.get("stalemate", False),
-                        "captured": result.get("captured"),
-                        "castling": result.get("castling"),
-                        "en_passant": result.get("en_passant"),
-                        "promotion": result.get("promotion"),
-                        "en_passant_target": result.get("en_passant_target"),
-                        "timers": room["timers"],
-                        "position_evaluation": position_eval
-                    })
-                    
-                    # Обновляем рейтинг при завершении игры
-                    if result.get("checkmate") or result.get("stalemate"):
-                        winner = None
-                        if result.get("checkmate"):
-                            winner = "black" if room["game"].current_player == "white" else "white"
-                        
-                        # Обновляем рейтинги
-                        if len(room["players"]) == 2:
-                            player1_id = room["players"][0]
-                            player2_id = room["players"][1]
-                            
-                            if winner:
-                                if room["colors"][player1_id] == winner:
-                                    result_value = 1.0
-                                else:
-                                    result_value = 0.0
-                            else:
-                                result_value = 0.5  # Ничья
-                            
-                            rating_update = await RatingSystem.update_rating(player1_id, player2_id, result_value)
-                            
-                            await manager.send_to_room(room_id, {
-                                "type": "rating_updated",
-                                "ratings": rating_update
-                            })
-                else:
-                    await manager.send_to_player(room_id, player_id, {
-                        "type": "error",
-                        "message": result.get("message", "Недопустимый ход")
-                    })
-            
-            elif message_type == "get_valid_moves":
-                pos = tuple(data.position)
-                moves = room["game"].get_valid_moves(pos)
-                
-                # Добавляем кастомные ходы из комнаты
-                x, y = pos
-                piece = room["game"].board[x][y]
-                logger.debug(f"get_valid_moves: pos={pos}, custom_moves={room['custom_moves']}")
-                if piece:
-                    color = piece.color
-                    piece_type = piece.type.value  # строка типа "pawn"
-                    custom = room["custom_moves"].get(color, {}).get(piece_type, {})
-                    logger.debug(f"Piece: {color} {piece_type}, custom for this piece: {custom}")
-                    
-                    custom_moves_list = custom.get("moves", [])
-                    custom_attacks_list = custom.get("attacks", [])
-                    
-                    # Добавляем кастомные ходы
-                    for move in custom_moves_list:
-                        dx, dy = move[0], move[1]
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 8 and 0 <= ny < 8:
-                            target = room["game"].board[nx][ny]
-                            if not target:
-                                if [nx, ny] not in moves["moves"]:
-                                    moves["moves"].append([nx, ny])
-                    
-                    # Добавляем кастомные атаки
-                    for attack in custom_attacks_list:
-                        dx, dy = attack[0], attack[1]
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < 8 and 0 <= ny < 8:
-                            target = room["game"].board[nx][ny]
-                            if target and target.color != color:
-                                if [nx, ny] not in moves["attacks"]:
-                                    moves["attacks"].append([nx, ny])
-                
-                await manager.send_to_player(room_id, player_id, {
-                    "type": "valid_moves",
-                    "position": data["position"],
-                    "moves": moves["moves"],
-                    "attacks": moves["attacks"]
-                })
-            
-            elif message_type == "resign":
-                winner = "black" if room["colors"].get(player_id) == "white" else "white"
-                await manager.send_to_room(room_id, {
-                    "type": "game_over",
-                    "reason": "resign",
-                    "winner": winner
-                })
-            
-            elif message_type == "add_custom_move":
-                color = data.color
-                piece_type = data.piece_type
-                move = data.move
-                is_attack = data.is_attack
-                
-                if color and piece_type and move:
-                    if piece_type not in room["custom_moves"][color]:
-                        room["custom_moves"][color][piece_type] = {"moves": [], "attacks": []}
-                    
-                    target = "attacks" if is_attack else "moves"
-                    if move not in room["custom_moves"][color][piece_type][target]:
-                        room["custom_moves"][color][piece_type][target].append(move)
-                    
-                    await manager.send_to_room(room_id, {
-                        "type": "custom_moves_updated",
-                        "custom_moves": room["custom_moves"]
-                    })
-            
-            elif message_type == "save_card":
-                color = data.color
-                name = data.name
-                card_data = data.card_data
-                logger.debug(f"Received save_card: {name}, color={color}, card_data={card_data}")
-                
-                if color and name and card_data:
-                    card_data["enabled"] = True
-                    room["ability_cards"][color][name] = card_data
-                    rebuild_custom_moves(room)
-                    
-                    logger.debug(f"custom_moves after rebuild: {room['custom_moves']}")
-                    await manager.send_to_room(room_id, {
-                        "type": "cards_updated",
-                        "ability_cards": room["ability_cards"],
-                        "custom_moves": room["custom_moves"]
-                    })
-                else:
-                    logger.warning(f"Missing data: color={color}, name={name}, card_data={card_data}")
-            
-            elif message_type == "delete_card":
-                color = data.color
-                name = data.name
-                
-                if color and name and name in room["ability_cards"][color]:
-                    del room["ability_cards"][color][name]
-                    rebuild_custom_moves(room)
-                    
-                    await manager.send_to_room(room_id, {
-                        "type": "cards_updated",
-                        "ability_cards": room["ability_cards"],
-                        "custom_moves": room["custom_moves"]
-                    })
-            
-            elif message_type == "toggle_card":
-                color = data.color
-                name = data.name
-                enabled = data.enabled
-                logger.debug(f"toggle_card: {name}, enabled={enabled}")
-                
-                if color and name and name in room["ability_cards"][color]:
-                    room["ability_cards"][color][name]["enabled"] = enabled
-                    rebuild_custom_moves(room)
-                    logger.debug(f"custom_moves after toggle: {room['custom_moves']}")
-                    
-                    await manager.send_to_room(room_id, {
-                        "type": "cards_updated",
-                        "ability_cards": room["ability_cards"],
-                        "custom_moves": room["custom_moves"]
-                    })
-            
-            elif message_type == "reset_custom_moves":
-                room["custom_moves"] = {"white": {}, "black": {}}
-                room["ability_cards"] = {"white": {}, "black": {}}
-                await manager.send_to_room(room_id, {
-                    "type": "cards_updated",
-                    "ability_cards": room["ability_cards"],
-                    "custom_moves": room["custom_moves"]
-                })
-            
-            elif message_type == "chat":
-                message = data.message
-                if message:
-                    # Отправляем сообщение всем кроме отправителя
-                    for pid, ws in manager.active_connections.get(room_id, {}).items():
-                        if pid != player_id:
-                            await ws.send_json({
-                                "type": "chat",
-                                "message": message
-                            })
-            
-            elif message_type == "offer_draw":
-                # Отправляем предложение ничьей противнику
-                for pid, ws in manager.active_connections.get(room_id, {}).items():
-                    if pid != player_id:
-                        await ws.send_json({"type": "draw_offered"})
-            
-            elif message_type == "draw_response":
-                accept = data.accept
-                if accept:
-                    await manager.send_to_room(room_id, {
-                        "type": "game_over",
-                        "reason": "draw",
-                        "winner": None
-                    })
-                else:
-                    for pid, ws in manager.active_connections.get(room_id, {}).items():
-                        if pid != player_id:
-                            await ws.send_json({"type": "draw_declined"})
-            
-            elif message_type == "request_undo":
-                # Запрос на отмену хода
-                for pid, ws in manager.active_connections.get(room_id, {}).items():
-                    if pid != player_id and pid in room["players"]:
-                        await ws.send_json({"type": "undo_requested"})
-                        room["undo_requests"][player_id] = True
-            
-            elif message_type == "undo_response":
-                accept = data.accept
-                if accept and room["move_history"]:
-                    # Отменяем последний ход
-                    last_move = room["move_history"].pop()
-                    room["game"] = ChessGame()  # Пересоздаём игру
-                    # Воспроизводим все ходы кроме последнего
-                    for move in room["move_history"]:
-                        room["game"].make_move(
-                            tuple(move["from"]), 
-                            tuple(move["to"]), 
-                            room["custom_moves"],
-                            move.get("promotion")
-                        )
-                    
-                    await manager.send_to_room(room_id, {
-                        "type": "undo_accepted",
-                        "board": room["game"].get_board_state(),
-                        "current_player": room["game"].current_player,
-                        "move_history": room["move_history"]
-                    })
-                else:
-                    for pid, ws in manager.active_connections.get(room_id, {}).items():
-                        if pid in room["undo_requests"]:
-                            await ws.send_json({"type": "undo_declined"})
-                room["undo_requests"] = {}
-            
-            elif message_type == "request_rematch":
-                room["rematch_requests"].add(player_id)
-                
-                # Если оба игрока согласны
-                if len(room["rematch_requests"]) >= 2:
-                    # Создаём новую игру
-                    room["game"] = ChessGame()
-                    room["move_history"] = []
-                    room["timers"] = {"white": 600, "black": 600}
-                    room["last_move_time"] = None
-                    room["rematch_requests"] = set()
-                    
-                    # Меняем цвета
-                    for pid in room["players"]:
-                        room["colors"][pid] = "black" if room["colors"][pid] == "white" else "white"
-                    
-                    await manager.send_to_room(room_id, {
-                        "type": "rematch_started",
-                        "board": room["game"].get_board_state(),
-                        "current_player": room["game"].current_player,
-                        "colors": room["colors"],
-                        "timers": room["timers"]
-                    })
-                else:
-                    # Уведомляем противника
-                    for pid, ws in manager.active_connections.get(room_id, {}).items():
-                        if pid != player_id and pid in room["players"]:
-                            await ws.send_json({"type": "rematch_requested"})
-            
-            elif message_type == "rematch_response":
-                accept = data.accept
-                if accept:
-                    room["rematch_requests"].add(player_id)
-                    if len(room["rematch_requests"]) >= 2:
-                        room["game"] = ChessGame()
-                        room["move_history"] = []
-                        room["timers"] = {"white": 600, "black": 600}
-                        room["last_move_time"] = None
-                        room["rematch_requests"] = set()
-                        
-                        for pid in room["players"]:
-                            room["colors"][pid] = "black" if room["colors"][pid] == "white" else "white"
-                        
-                        await manager.send_to_room(room_id, {
-                            "type": "rematch_started",
-                            "board": room["game"].get_board_state(),
-                            "current_player": room["game"].current_player,
-                            "colors": room["colors"],
-                            "timers": room["timers"]
-                        })
-                else:
-                    room["rematch_requests"] = set()
-                    for pid, ws in manager.active_connections.get(room_id, {}).items():
-                        if pid != player_id:
-                            await ws.send_json({"type": "rematch_declined"})
-            
-            elif message_type == "set_time_control":
-                # Установка контроля времени
-                room["timers"]["white"] = data.time
-                room["timers"]["black"] = data.time
-                room["increment"] = data.increment
-                room["delay"] = data.delay
-                
-                await manager.send_to_room(room_id, {
-                    "type": "time_control_updated",
-                    "timers": room["timers"],
-                    "increment": room["increment"],
-                    "delay": room["delay"]
-                })
-            
-            elif message_type == "get_position_analysis":
-                # Анализ позиции
-                analysis = PositionAnalyzer.analyze_threats(room["game"].board, room["colors"].get(player_id, "white"))
-                evaluation = PositionAnalyzer.evaluate_position(room["game"].board, room["colors"].get(player_id, "white"))
-                
-                await manager.send_to_player(room_id, player_id, {
-                    "type": "position_analysis",
-                    "evaluation": evaluation,
-                    "threats": analysis
-                })
-            
-            elif message_type == "export_pgn":
-                # Экспорт партии в PGN
-                white_name = data.white_name or "White"
-                black_name = data.black_name or "Black"
-                result = data.result or "*"
-                
-                pgn = PGNExporter.export_game(
-                    room["move_history"],
-                    white_name,
-                    black_name,
-                    result
-                )
-                
-                await manager.send_to_player(room_id, player_id, {
-                    "type": "pgn_exported",
-                    "pgn": pgn
-                })
-            
-            elif message_type == "get_rating":
-                # Получить рейтинг игрока
-                rating = await RatingSystem.get_rating(player_id)
-                rank = RatingSystem.get_rank(rating)
-                history = await RatingSystem.get_rating_history(player_id, 10)
-                
-                await manager.send_to_player(room_id, player_id, {
-                    "type": "rating_info",
-                    "rating": rating,
-                    "rank": rank,
-                    "history": history
-                })
-    
+
+            await HANDLERS[message_type](room_id, room, player_id, data)
+
+
+@asynccontextmanager
+async def _room_session(room_id: str, room: dict, player_id: str):
+    """Оборачивает цикл сообщений: разрыв и аварийная очистка — здесь.
+
+    Вынос try/except из гигантского обработчика оставляет горячий цикл
+    компактным, а вся логика «игрок ушёл» (сохранение партии, player_left,
+    передача комнаты reaper'у) живёт в одном месте.
+    """
+    try:
+        yield
     except WebSocketDisconnect:
-        logger.info(f"Игрок {player_id} отключился от комнаты {room_id}")
+        logger.info("Игрок %s отключился от комнаты %s", player_id, room_id)
         manager.disconnect(room_id, player_id)
-        
+
+        # Ключи players/spectators гарантированно есть после connect —
+        # берём списки один раз, чтобы не плодить пустые списки-умолчания
+        players = room.setdefault("players", [])
+        spectators = room.setdefault("spectators", [])
+
         # Сохраняем состояние игры при неожиданном отключении
-        if player_id in room.get("players", []):
-            room["players"].remove(player_id)
-            
-            # Если игра была в процессе, сохраняем её
+        white_id = black_id = None
+        if player_id in players:
+            players.remove(player_id)
+
+            # Если игра была в процессе, готовим её к сохранению
             if room.get("game") and len(room["move_history"]) > 0:
-                try:
-                    white_id = room["players"][0] if len(room["players"]) > 0 and room["colors"].get(room["players"][0]) == "white" else None
-                    black_id = room["players"][0] if len(room["players"]) > 0 and room["colors"].get(room["players"][0]) == "black" else None
-                    
-                    if white_id and black_id:
-                        await db.save_game(
-                            white_id, black_id,
-                            result="*",  # Незавершённая игра
-                            move_history=room["move_history"]
-                        )
-                        logger.info(f"Игра сохранена при отключении игрока {player_id}")
-                except Exception as e:
-                    logger.error(f"Ошибка при сохранении игры при отключении: {e}", exc_info=True)
-        
-        # Уведомляем остальных игроков
-        try:
-            await manager.send_to_room(room_id, {
-                "type": "player_left",
-                "players_count": len(room.get("players", [])),
-                "player_id": player_id
-            })
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления об отключении: {e}", exc_info=True)
-        
-        # Удаляем комнату если она пуста
-        if len(room.get("players", [])) == 0 and len(room.get("spectators", [])) == 0:
-            if room_id in rooms:
-                del rooms[room_id]
-                logger.info(f"Комната {room_id} удалена (пуста)")
+                white_id = players[0] if len(players) > 0 and room["colors"].get(players[0]) == "white" else None
+                black_id = players[0] if len(players) > 0 and room["colors"].get(players[0]) == "black" else None
+
+        # Сохранение игры и уведомление остальных не зависят друг от друга —
+        # выполняем их параллельно через gather с return_exceptions, чтобы
+        # ошибка записи в БД не отменила уведомление player_left
+        tasks = []
+        if white_id and black_id:
+            tasks.append(db.save_game(
+                white_id, black_id,
+                result="*",  # Незавершённая игра
+                move_history=room["move_history"]
+            ))
+        tasks.append(manager.broadcast_prepared(
+            room_id, _player_left_payload(len(players), player_id)
+        ))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Ошибка при обработке отключения игрока %s: %s", player_id, result, exc_info=result)
+
+        # Отдаём комнату фоновому reaper'у — он сам перепроверит занятость
+        _reap_queue.append(room_id)
     except Exception as e:
-        logger.error(f"Неожиданная ошибка в WebSocket соединении {player_id}: {e}", exc_info=True)
+        logger.error("Неожиданная ошибка в WebSocket соединении %s: %s", player_id, e, exc_info=True)
         try:
             manager.disconnect(room_id, player_id)
         except:
@@ -1234,11 +1673,41 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
 
 
 # Для совместимости со старыми ссылками /v2 -> /v2.5
+# Страница статична — читаем и сжимаем её один раз при импорте,
+# чтобы не делать stat()/open() на каждый запрос легаси-клиентов
+_V2_HTML = (FRONTEND_V25_DIR / "index.html").read_bytes()
+_V2_HTML_GZ = gzip.compress(_V2_HTML, compresslevel=6)
+_V2_ETAG = hashlib.md5(_V2_HTML).hexdigest()
+
+
 @app.get("/v2")
-async def v2_redirect():
-    return FileResponse(str(FRONTEND_V25_DIR / "index.html"))
+async def v2_redirect(request: Request):
+    if request.headers.get("if-none-match") == _V2_ETAG:
+        return Response(status_code=304, headers={"ETag": _V2_ETAG})
+    headers = {"ETag": _V2_ETAG}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=_V2_HTML_GZ, media_type="text/html", headers=headers)
+    return Response(content=_V2_HTML, media_type="text/html", headers=headers)
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # C-расширения uvloop/httptools/websockets заметно ускоряют event loop
+    # и парсинг протоколов; uvloop недоступен на Windows
+    loop_impl = "uvloop" if sys.platform != "win32" else "asyncio"
+    # Несколько воркеров распараллеливают CPU-тяжёлые пути (валидация,
+    # PGN, анализ) по ядрам. Комнаты живут в памяти процесса, поэтому при
+    # WEB_CONCURRENCY > 1 балансировщик обязан закреплять клиентов одной
+    # комнаты за воркером (nginx: hash $arg_room_id consistent);
+    # по умолчанию остаёмся на одном процессе
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    # permessage-deflate: JSON доски/истории сжимается в разы, а zlib
+    # на уровне 1 почти бесплатен — меньше байт и syscall'ов на кадр
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8000,
+        loop=loop_impl, http="httptools", ws="websockets",
+        ws_per_message_deflate=True,
+        workers=workers
+    )
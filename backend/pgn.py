@@ -1,7 +1,22 @@
 # pgn.py - Экспорт и импорт партий в формате PGN
+import textwrap
 from typing import List, Dict, Optional
 from datetime import datetime
 
+# Таблицы нотации собираются один раз при импорте: конвертация клетки —
+# это один индекс в кортеж вместо склейки срезов строк на каждый ход
+_FILES = "abcdefgh"
+_RANKS = "12345678"
+_SQUARES = tuple(_FILES[x] + _RANKS[7 - y] for y in range(8) for x in range(8))
+_PIECE_SYM = {
+    "pawn": "",
+    "rook": "R",
+    "knight": "N",
+    "bishop": "B",
+    "queen": "Q",
+    "king": "K"
+}
+
 
 class PGNExporter:
     """Экспортёр партий в формат PGN"""
@@ -44,72 +59,60 @@ class PGNExporter:
             ''
         ]
         
-        # Ходы
-        moves = []
-        move_number = 1
-        
+        # Ходы: токены собираются в список и склеиваются одним join —
+        # конкатенация в moves[-1] += ... была квадратичной на длинных партиях
+        tokens = []
         for i, move in enumerate(move_history):
-            from_pos = move["from"]
-            to_pos = move["to"]
-            
-            # Конвертируем координаты в шахматную нотацию
-            from_square = PGNExporter._coords_to_square(from_pos)
-            to_square = PGNExporter._coords_to_square(to_pos)
-            
-            piece_type = move.get("piece", {}).get("type", "pawn")
-            piece_symbol = PGNExporter._piece_to_symbol(piece_type)
-            
-            # Формируем нотацию хода
-            if move.get("captured"):
-                notation = f"{piece_symbol}{from_square}x{to_square}"
-            else:
-                notation = f"{piece_symbol}{from_square}-{to_square}"
-            
-            # Превращение пешки
-            if move.get("promotion"):
-                notation += f"={PGNExporter._piece_to_symbol(move['promotion']).upper()}"
-            
-            # Рокировка
-            if move.get("castling") == "kingside":
-                notation = "O-O"
-            elif move.get("castling") == "queenside":
-                notation = "O-O-O"
-            
-            # Взятие на проходе
-            if move.get("en_passant"):
-                notation = f"{from_square[0]}x{to_square}"
-            
-            # Добавляем номер хода для белых
             if i % 2 == 0:
-                moves.append(f"{move_number}. {notation}")
-            else:
-                moves[-1] += f" {notation}"
-                move_number += 1
-        
-        pgn_lines.append(" ".join(moves))
-        pgn_lines.append(result)
-        
+                tokens.append(f"{i // 2 + 1}.")
+            tokens.append(PGNExporter._build_notation(move))
+        tokens.append(result)
+
+        # Стандарт PGN требует переносить текст ходов по 80 колонок
+        pgn_lines.append(textwrap.fill(" ".join(tokens), width=80, break_long_words=False))
+
         return "\n".join(pgn_lines)
+
+    @staticmethod
+    def _build_notation(move: Dict) -> str:
+        """Построить нотацию одного хода (рокировка, взятие, превращение)."""
+        castling = move.get("castling")
+        if castling == "kingside":
+            return "O-O"
+        if castling == "queenside":
+            return "O-O-O"
+
+        from_square = PGNExporter._coords_to_square(move["from"])
+        to_square = PGNExporter._coords_to_square(move["to"])
+
+        if move.get("en_passant"):
+            notation = f"{from_square[0]}x{to_square}"
+        else:
+            # Тип фигуры хранится строкой ("knight"); старые записи могли
+            # содержать словарь {"type": ...} — поддерживаем оба формата
+            piece = move.get("piece")
+            if isinstance(piece, dict):
+                piece_type = piece.get("type", "pawn")
+            else:
+                piece_type = piece or "pawn"
+            piece_symbol = PGNExporter._piece_to_symbol(piece_type)
+            separator = "x" if move.get("captured") else "-"
+            notation = f"{piece_symbol}{from_square}{separator}{to_square}"
+
+        # Превращение пешки
+        if move.get("promotion"):
+            notation += f"={PGNExporter._piece_to_symbol(move['promotion']).upper()}"
+        return notation
     
     @staticmethod
     def _coords_to_square(coords: List[int]) -> str:
         """Конвертировать координаты [x, y] в шахматную нотацию (например, e4)"""
-        files = "abcdefgh"
-        ranks = "12345678"
-        return files[coords[0]] + ranks[7 - coords[1]]
-    
+        return _SQUARES[coords[1] * 8 + coords[0]]
+
     @staticmethod
     def _piece_to_symbol(piece_type: str) -> str:
         """Конвертировать тип фигуры в символ для PGN"""
-        symbols = {
-            "pawn": "",
-            "rook": "R",
-            "knight": "N",
-            "bishop": "B",
-            "queen": "Q",
-            "king": "K"
-        }
-        return symbols.get(piece_type, "")
+        return _PIECE_SYM.get(piece_type, "")
 
 
 class PGNImporter:
@@ -1,49 +1,72 @@
 # rating.py - Система рейтинга Elo
+import asyncio
+import time
+from bisect import bisect_right
+from collections import defaultdict
 from typing import Dict, Tuple
 from database import db
 from logger import setup_logger
 
 logger = setup_logger()
 
+# Кэш рейтингов в памяти процесса: get_rating дёргается на каждое открытие
+# UI, и поход в SQLite был бы доминирующей задержкой. TTL короткий, а запись
+# нового рейтинга в update_rating сразу освежает кэш, так что устаревание
+# видно только между процессами
+_RATING_TTL = 30.0
+_rating_cache: Dict[str, Tuple[int, float]] = {}  # player_id -> (rating, годен_до)
+# Замки коалесцируют конкурентные чтения одного игрока в один запрос к БД
+_rating_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+# Пороги рангов для бинарного поиска: ранг i действует до _RANK_THRESHOLDS[i]
+_RANK_THRESHOLDS = (1000, 1200, 1400, 1600, 1800, 2000, 2200)
+_RANKS = (
+    "Новичок", "Любитель", "Разрядник", "Кандидат",
+    "Мастер", "Гроссмейстер", "Международный мастер", "Гранд-мастер"
+)
+
 
 class RatingSystem:
     """Система расчёта рейтинга Elo"""
-    
+
     K_FACTOR = 32  # Коэффициент K для Elo
-    
+
     @staticmethod
     async def get_rating(player_id: str) -> int:
         """
         Получить текущий рейтинг игрока.
-        
+
         Args:
             player_id: ID игрока
-            
+
         Returns:
             Текущий рейтинг игрока
         """
-        player = await db.get_or_create_player(player_id)
-        return player.get("rating", 1200)
+        cached = _rating_cache.get(player_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        async with _rating_locks[player_id]:
+            # Перепроверяем: пока ждали замок, сосед мог заполнить кэш
+            cached = _rating_cache.get(player_id)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+            player = await db.get_or_create_player(player_id)
+            rating = player.get("rating", 1200)
+            _rating_cache[player_id] = (rating, time.monotonic() + _RATING_TTL)
+            return rating
+
+    @staticmethod
+    def invalidate_cache(player_id: str = None):
+        """Сбросить кэш рейтингов (целиком или для одного игрока)."""
+        if player_id is None:
+            _rating_cache.clear()
+        else:
+            _rating_cache.pop(player_id, None)
     
     @staticmethod
     def get_rank(rating: int) -> str:
         """Определить ранг по рейтингу"""
-        if rating < 1000:
-            return "Новичок"
-        elif rating < 1200:
-            return "Любитель"
-        elif rating < 1400:
-            return "Разрядник"
-        elif rating < 1600:
-            return "Кандидат"
-        elif rating < 1800:
-            return "Мастер"
-        elif rating < 2000:
-            return "Гроссмейстер"
-        elif rating < 2200:
-            return "Международный мастер"
-        else:
-            return "Гранд-мастер"
+        return _RANKS[bisect_right(_RANK_THRESHOLDS, rating)]
     
     @staticmethod
     def calculate_elo(player_rating: int, opponent_rating: int, result: float) -> Tuple[int, int]:
@@ -67,7 +90,33 @@ class RatingSystem:
         new_opponent_rating = round(opponent_rating + RatingSystem.K_FACTOR * ((1 - result) - expected_opponent))
         
         return new_player_rating, new_opponent_rating
-    
+
+    @staticmethod
+    def calculate_elo_batch(player_ratings, opponent_ratings, results):
+        """
+        Рассчитать Elo для серии партий одним проходом.
+
+        Для массовых пересчётов (турнир, импорт истории) дешевле одного
+        вызова calculate_elo на партию: константы поднимаются из цикла,
+        без создания кортежей на каждый вызов.
+
+        Args:
+            player_ratings: Рейтинги игроков
+            opponent_ratings: Рейтинги соперников (той же длины)
+            results: Результаты для игроков (1.0 / 0.5 / 0.0)
+
+        Returns:
+            Tuple[список новых рейтингов игроков, список новых рейтингов соперников]
+        """
+        k = RatingSystem.K_FACTOR
+        new_players = []
+        new_opponents = []
+        for p, o, r in zip(player_ratings, opponent_ratings, results):
+            expected = 1 / (1 + 10 ** ((o - p) / 400))
+            new_players.append(round(p + k * (r - expected)))
+            new_opponents.append(round(o + k * ((1 - r) - (1 - expected))))
+        return new_players, new_opponents
+
     @staticmethod
     async def update_rating(player_id: str, opponent_id: str, result: float):
         """
@@ -81,26 +130,41 @@ class RatingSystem:
         Returns:
             Словарь с новыми рейтингами и изменениями
         """
-        player_rating = await RatingSystem.get_rating(player_id)
-        opponent_rating = await RatingSystem.get_rating(opponent_id)
-        
+        player_rating, opponent_rating = await asyncio.gather(
+            RatingSystem.get_rating(player_id),
+            RatingSystem.get_rating(opponent_id)
+        )
+
         new_player_rating, new_opponent_rating = RatingSystem.calculate_elo(
             player_rating, opponent_rating, result
         )
-        
-        # Обновляем рейтинги в БД
-        await db.update_player_rating(player_id, new_player_rating)
-        await db.update_player_rating(opponent_id, new_opponent_rating)
-        
-        # Сохраняем историю
-        await db.add_rating_history(
-            player_id, player_rating, new_player_rating,
-            opponent_id, opponent_rating, result
-        )
-        await db.add_rating_history(
-            opponent_id, opponent_rating, new_opponent_rating,
-            player_id, player_rating, 1 - result
-        )
+
+        # Обновляем рейтинги и историю одной транзакцией: четыре отдельных
+        # commit'а — это четыре fsync вместо одного
+        async with db.transaction() as conn:
+            await conn.executemany(
+                "UPDATE players SET rating = ?, updated_at = CURRENT_TIMESTAMP WHERE player_id = ?",
+                [(new_player_rating, player_id), (new_opponent_rating, opponent_id)]
+            )
+            await conn.executemany(
+                """
+                INSERT INTO rating_history
+                (player_id, old_rating, new_rating, opponent_id, opponent_rating, result)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (player_id, player_rating, new_player_rating,
+                     opponent_id, opponent_rating, result),
+                    (opponent_id, opponent_rating, new_opponent_rating,
+                     player_id, player_rating, 1 - result)
+                ]
+            )
+
+        # Освежаем кэш новыми значениями вместо инвалидации — следующее
+        # чтение остаётся горячим
+        expires = time.monotonic() + _RATING_TTL
+        _rating_cache[player_id] = (new_player_rating, expires)
+        _rating_cache[opponent_id] = (new_opponent_rating, expires)
         
         return {
             "player_rating": new_player_rating,
@@ -2,7 +2,7 @@
 Pydantic схемы для валидации данных WebSocket сообщений.
 """
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 
 class Position(BaseModel):
@@ -15,10 +15,10 @@ class MoveRequest(BaseModel):
     """Запрос на выполнение хода."""
     model_config = ConfigDict(populate_by_name=True)
     
-    type: str = Field(..., pattern="^move$")
+    type: Literal["move"] = "move"
     from_pos: List[int] = Field(..., min_length=2, max_length=2, alias="from")
     to_pos: List[int] = Field(..., min_length=2, max_length=2, alias="to")
-    promotion: Optional[str] = Field(None, pattern="^(queen|rook|bishop|knight)$")
+    promotion: Optional[Literal["queen", "rook", "bishop", "knight"]] = None
     
     @field_validator('from_pos', 'to_pos')
     @classmethod
@@ -34,7 +34,7 @@ class MoveRequest(BaseModel):
 
 class GetValidMovesRequest(BaseModel):
     """Запрос на получение допустимых ходов."""
-    type: str = Field(..., pattern="^get_valid_moves$")
+    type: Literal["get_valid_moves"] = "get_valid_moves"
     position: List[int] = Field(..., min_length=2, max_length=2)
     
     @field_validator('position')
@@ -51,9 +51,9 @@ class GetValidMovesRequest(BaseModel):
 
 class CustomMoveRequest(BaseModel):
     """Запрос на добавление кастомного хода."""
-    type: str = Field(..., pattern="^add_custom_move$")
-    color: str = Field(..., pattern="^(white|black)$")
-    piece_type: str = Field(..., pattern="^(pawn|rook|knight|bishop|queen|king)$")
+    type: Literal["add_custom_move"] = "add_custom_move"
+    color: Literal["white", "black"]
+    piece_type: Literal["pawn", "rook", "knight", "bishop", "queen", "king"]
     move: List[int] = Field(..., min_length=2, max_length=2)
     is_attack: bool = False
     
@@ -68,74 +68,84 @@ class CustomMoveRequest(BaseModel):
 
 class SaveCardRequest(BaseModel):
     """Запрос на сохранение карточки способностей."""
-    type: str = Field(..., pattern="^save_card$")
-    color: str = Field(..., pattern="^(white|black)$")
+    type: Literal["save_card"] = "save_card"
+    color: Literal["white", "black"]
     name: str = Field(..., min_length=1, max_length=100)
     card_data: dict
 
 
 class ToggleCardRequest(BaseModel):
     """Запрос на переключение карточки."""
-    type: str = Field(..., pattern="^toggle_card$")
-    color: str = Field(..., pattern="^(white|black)$")
+    type: Literal["toggle_card"] = "toggle_card"
+    color: Literal["white", "black"]
     name: str = Field(..., min_length=1, max_length=100)
     enabled: bool = True
 
 
 class DeleteCardRequest(BaseModel):
     """Запрос на удаление карточки."""
-    type: str = Field(..., pattern="^delete_card$")
-    color: str = Field(..., pattern="^(white|black)$")
+    type: Literal["delete_card"] = "delete_card"
+    color: Literal["white", "black"]
     name: str = Field(..., min_length=1, max_length=100)
 
 
+class ResetCustomMovesRequest(BaseModel):
+    """Запрос на сброс кастомных ходов и карточек."""
+    type: Literal["reset_custom_moves"] = "reset_custom_moves"
+
+
+class RequestFullStateRequest(BaseModel):
+    """Запрос полного состояния партии (ресинхронизация клиента)."""
+    type: Literal["request_full_state"] = "request_full_state"
+
+
 class ChatRequest(BaseModel):
     """Запрос на отправку сообщения в чат."""
-    type: str = Field(..., pattern="^chat$")
+    type: Literal["chat"] = "chat"
     message: str = Field(..., min_length=1, max_length=500)
 
 
 class ResignRequest(BaseModel):
     """Запрос на сдачу."""
-    type: str = Field(..., pattern="^resign$")
+    type: Literal["resign"] = "resign"
 
 
 class OfferDrawRequest(BaseModel):
     """Запрос на предложение ничьей."""
-    type: str = Field(..., pattern="^offer_draw$")
+    type: Literal["offer_draw"] = "offer_draw"
 
 
 class DrawResponseRequest(BaseModel):
     """Ответ на предложение ничьей."""
-    type: str = Field(..., pattern="^draw_response$")
+    type: Literal["draw_response"] = "draw_response"
     accept: bool
 
 
 class RequestUndoRequest(BaseModel):
     """Запрос на отмену хода."""
-    type: str = Field(..., pattern="^request_undo$")
+    type: Literal["request_undo"] = "request_undo"
 
 
 class UndoResponseRequest(BaseModel):
     """Ответ на запрос отмены хода."""
-    type: str = Field(..., pattern="^undo_response$")
+    type: Literal["undo_response"] = "undo_response"
     accept: bool
 
 
 class RequestRematchRequest(BaseModel):
     """Запрос на реванш."""
-    type: str = Field(..., pattern="^request_rematch$")
+    type: Literal["request_rematch"] = "request_rematch"
 
 
 class RematchResponseRequest(BaseModel):
     """Ответ на запрос реванша."""
-    type: str = Field(..., pattern="^rematch_response$")
+    type: Literal["rematch_response"] = "rematch_response"
     accept: bool
 
 
 class SetTimeControlRequest(BaseModel):
     """Запрос на установку контроля времени."""
-    type: str = Field(..., pattern="^set_time_control$")
+    type: Literal["set_time_control"] = "set_time_control"
     time: int = Field(..., ge=1, le=3600, description="Время в секундах")
     increment: int = Field(0, ge=0, le=60, description="Инкремент в секундах")
     delay: int = Field(0, ge=0, le=60, description="Задержка в секундах")
@@ -143,20 +153,20 @@ class SetTimeControlRequest(BaseModel):
 
 class GetPositionAnalysisRequest(BaseModel):
     """Запрос на анализ позиции."""
-    type: str = Field(..., pattern="^get_position_analysis$")
+    type: Literal["get_position_analysis"] = "get_position_analysis"
 
 
 class ExportPGNRequest(BaseModel):
     """Запрос на экспорт PGN."""
-    type: str = Field(..., pattern="^export_pgn$")
+    type: Literal["export_pgn"] = "export_pgn"
     white_name: Optional[str] = Field(None, max_length=100)
     black_name: Optional[str] = Field(None, max_length=100)
-    result: Optional[str] = Field("*", pattern="^(1-0|0-1|1/2-1/2|\\*)$")
+    result: Optional[Literal["1-0", "0-1", "1/2-1/2", "*"]] = "*"
 
 
 class GetRatingRequest(BaseModel):
     """Запрос на получение рейтинга."""
-    type: str = Field(..., pattern="^get_rating$")
+    type: Literal["get_rating"] = "get_rating"
 
 
 class CreateTournamentRoomRequest(BaseModel):
@@ -168,5 +178,5 @@ class CreateTournamentRoomRequest(BaseModel):
 class JoinTournamentRoomRequest(BaseModel):
     """Запрос на присоединение к турнирной комнате."""
     player_id: str = Field(..., min_length=1, description="ID игрока")
-    role: Optional[str] = Field(None, pattern="^(player|spectator)$", description="Роль: player или spectator")
+    role: Optional[Literal["player", "spectator"]] = Field(None, description="Роль: player или spectator")
 
@@ -0,0 +1,109 @@
+"""
+Тесты игрового websocket-эндпоинта /ws/{room_id}/{player_id}.
+"""
+import pytest
+import asyncio
+import sys
+import os
+from pathlib import Path
+
+# Добавляем путь к backend модулю
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+import main
+from main import app, rooms
+from database import db as global_db
+from rating import RatingSystem
+
+
+@pytest.fixture
+def clean_rooms():
+    """Очищает комнаты до и после теста."""
+    rooms.clear()
+    yield
+    rooms.clear()
+
+
+@pytest.fixture
+def test_db():
+    """Направляет глобальную БД в тестовый файл и убирает его после."""
+    global_db.db_path = "test_chess.db"
+    global_db._initialized = False
+
+    async def prepare():
+        await global_db.initialize()
+        await global_db.close()
+
+    asyncio.run(prepare())
+    yield
+    global_db._initialized = False
+    RatingSystem.invalidate_cache()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"test_chess.db{suffix}"):
+            os.remove(f"test_chess.db{suffix}")
+
+
+def _wait_for(ws, message_type):
+    """Читает сообщения, пока не встретит нужный тип (фоновые пропускаются)."""
+    for _ in range(10):
+        msg = ws.receive_json()
+        if msg["type"] == message_type:
+            return msg
+    raise AssertionError(f"Сообщение {message_type} не получено")
+
+
+def test_game_endpoint_move_broadcast(clean_rooms, test_db):
+    """Ход одного игрока доставляется обоим вместе с обновлённой доской."""
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/game_room/ge_p1") as ws1:
+            init1 = ws1.receive_json()
+            assert init1["type"] == "init"
+            assert init1["color"] == "white"
+            # Склеенный init-фрагмент содержит общую часть состояния
+            assert len(init1["board"]) == 8
+            assert init1["current_player"] == "white"
+
+            with client.websocket_connect("/ws/game_room/ge_p2") as ws2:
+                init2 = ws2.receive_json()
+                assert init2["type"] == "init"
+                assert init2["color"] == "black"
+
+                # Белая пешка e2-e4 (x=4: y=6 -> y=4)
+                ws1.send_json({"type": "move", "from": [4, 6], "to": [4, 4]})
+                for ws in (ws1, ws2):
+                    move = _wait_for(ws, "move")
+                    assert move["from"] == [4, 6]
+                    assert move["to"] == [4, 4]
+                    assert move["current_player"] == "black"
+                    assert move["board"][4][6] is None
+                    assert move["board"][4][4]["type"] == "pawn"
+                    assert move["board"][4][4]["color"] == "white"
+
+                # Ответный ход чёрных: кэш доски после хода сброшен корректно
+                ws2.send_json({"type": "move", "from": [4, 1], "to": [4, 3]})
+                for ws in (ws1, ws2):
+                    move = _wait_for(ws, "move")
+                    assert move["current_player"] == "white"
+                    assert move["board"][4][3]["color"] == "black"
+
+                # Соединение живо: обычное сообщение после ходов доходит
+                ws1.send_json({"type": "chat", "message": "gg"})
+                chat = _wait_for(ws2, "chat")
+                assert chat["message"] == "gg"
+
+
+def test_game_endpoint_full_state_resync(clean_rooms, test_db):
+    """request_full_state возвращает актуальное состояние после хода."""
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/resync_room/ge_p1") as ws1:
+            assert ws1.receive_json()["type"] == "init"
+            ws1.send_json({"type": "move", "from": [4, 6], "to": [4, 4]})
+            _wait_for(ws1, "move")
+
+            ws1.send_json({"type": "request_full_state"})
+            state = _wait_for(ws1, "full_state")
+            assert state["board"][4][4]["type"] == "pawn"
+            assert state["current_player"] == "black"
+            assert len(state["move_history"]) == 1
@@ -0,0 +1,80 @@
+"""
+Unit-тесты для инкрементальной отмены хода в ChessGame.
+"""
+import pytest
+import sys
+from pathlib import Path
+
+# Добавляем путь к backend модулю
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from game_logic import ChessGame
+
+
+def _snapshot(game):
+    return (game.get_board_state(), game.current_player, game.en_passant_target)
+
+
+def test_undo_simple_move_restores_position():
+    """Отмена обычного хода возвращает исходную позицию и очередь."""
+    game = ChessGame()
+    before = _snapshot(game)
+    assert game.make_move((4, 6), (4, 4))["success"]
+
+    assert game.undo() is True
+    assert _snapshot(game) == before
+    assert game.move_history == []
+
+
+def test_undo_restores_captured_piece():
+    """Отмена взятия возвращает съеденную фигуру на доску."""
+    game = ChessGame()
+    game.make_move((4, 6), (4, 4))  # e2-e4
+    game.make_move((3, 1), (3, 3))  # d7-d5
+    before = _snapshot(game)
+    result = game.make_move((4, 4), (3, 3))  # exd5
+    assert result["captured"]
+
+    assert game.undo() is True
+    assert _snapshot(game) == before
+    pawn = game.board[3][3]
+    assert pawn is not None and pawn.color == "black"
+
+
+def test_undo_castling_returns_rook():
+    """Отмена рокировки возвращает короля и ладью со сбросом moved."""
+    game = ChessGame()
+    game.make_move((4, 6), (4, 4))
+    game.make_move((4, 1), (4, 3))
+    game.make_move((6, 7), (5, 5))
+    game.make_move((6, 0), (5, 2))
+    game.make_move((5, 7), (4, 6))
+    game.make_move((5, 0), (4, 1))
+    before = _snapshot(game)
+    result = game.make_move((4, 7), (6, 7))  # O-O
+    assert result["castling"] == "kingside"
+
+    assert game.undo() is True
+    assert _snapshot(game) == before
+    rook = game.board[7][7]
+    assert rook is not None and rook.type.value == "rook" and not rook.moved
+
+
+def test_undo_pawn_move_restores_en_passant_target():
+    """Отмена двойного хода пешки сбрасывает en passant target."""
+    game = ChessGame()
+    result = game.make_move((4, 6), (4, 4))
+    assert result["en_passant_target"] is not None
+
+    assert game.undo() is True
+    assert game.en_passant_target is None
+
+
+def test_undo_without_moves_returns_false():
+    """Отмена при пустой истории ничего не делает."""
+    game = ChessGame()
+    assert game.undo() is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,134 @@
+"""
+Unit-тесты для матчмейкинга.
+"""
+import pytest
+import asyncio
+import sys
+import time
+import os
+from pathlib import Path
+
+# Добавляем путь к backend модулю
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+import main
+from main import app, matchmaking_queue, matchmaking_index
+from database import db as global_db
+from rating import RatingSystem
+
+
+@pytest.fixture
+def clean_queue():
+    """Очищает очередь матчмейкинга до и после теста."""
+    matchmaking_queue.clear()
+    matchmaking_index.clear()
+    yield
+    matchmaking_queue.clear()
+    matchmaking_index.clear()
+
+
+@pytest.fixture
+def test_db():
+    """Направляет глобальную БД в тестовый файл и убирает его после."""
+    global_db.db_path = "test_chess.db"
+    global_db._initialized = False
+
+    # Создаём таблицы заранее: в приложении initialize() идёт фоновой
+    # задачей и endpoint мог бы обогнать её. Соединение закрываем — внутри
+    # TestClient оно откроется заново в его event loop
+    async def prepare():
+        await global_db.initialize()
+        await global_db.close()
+
+    asyncio.run(prepare())
+    yield
+    global_db._initialized = False
+    RatingSystem.invalidate_cache()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"test_chess.db{suffix}"):
+            os.remove(f"test_chess.db{suffix}")
+
+
+def _entry(loop, player_id, rating, timestamp=None):
+    return {
+        "player_id": player_id,
+        "websocket": None,
+        "rating": rating,
+        "timestamp": timestamp if timestamp is not None else time.monotonic(),
+        "future": loop.create_future(),
+    }
+
+
+@pytest.mark.asyncio
+async def test_match_pairs_resolves_closest_rating(clean_queue):
+    """Matcher спаривает ближайших по рейтингу и резолвит оба future."""
+    loop = asyncio.get_running_loop()
+    a = _entry(loop, "a", 1200)
+    b = _entry(loop, "b", 1210)
+    c = _entry(loop, "c", 2000)
+    for entry in (a, b, c):
+        matchmaking_queue.add(entry)
+        matchmaking_index[entry["player_id"]] = entry
+
+    main._match_pairs()
+
+    assert a["future"].done() and b["future"].done()
+    assert not c["future"].done()
+    result_a = a["future"].result()
+    result_b = b["future"].result()
+    assert result_a["room_id"] == result_b["room_id"]
+    assert result_a["opponent_rating"] == 1210
+    assert result_b["opponent_rating"] == 1200
+    # Спаренные удалены из очереди и индекса, c остался ждать
+    assert "a" not in matchmaking_index and "b" not in matchmaking_index
+    assert len(matchmaking_queue) == 1
+
+
+@pytest.mark.asyncio
+async def test_match_pairs_widens_window_over_time(clean_queue):
+    """Диапазон допустимой разницы рейтингов растёт со временем ожидания."""
+    loop = asyncio.get_running_loop()
+    a = _entry(loop, "a", 1200)
+    b = _entry(loop, "b", 2000)
+    for entry in (a, b):
+        matchmaking_queue.add(entry)
+        matchmaking_index[entry["player_id"]] = entry
+
+    # Свежие заявки: разница 800 > max_diff ~100 — пары нет
+    main._match_pairs()
+    assert not a["future"].done() and not b["future"].done()
+
+    # Состарим заявки: через 100 секунд max_diff уже 1100
+    a["timestamp"] -= 100
+    b["timestamp"] -= 100
+    main._match_pairs()
+    assert a["future"].done() and b["future"].done()
+
+
+def test_matchmaking_endpoint_pairs_two_players(clean_queue, test_db):
+    """Два подключившихся игрока получают match_found с общей комнатой."""
+
+    def wait_match(ws):
+        for _ in range(10):
+            msg = ws.receive_json()
+            if msg["type"] == "match_found":
+                return msg
+        raise AssertionError("match_found не получен")
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/matchmaking/mm_p1") as ws1:
+            assert ws1.receive_json()["type"] == "queued"
+            with client.websocket_connect("/ws/matchmaking/mm_p2") as ws2:
+                assert ws2.receive_json()["type"] == "queued"
+                m1 = wait_match(ws1)
+                m2 = wait_match(ws2)
+                assert m1["room_id"] == m2["room_id"]
+                assert m1["opponent_rating"] == 1200
+                assert m2["opponent_rating"] == 1200
+    assert len(matchmaking_queue) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
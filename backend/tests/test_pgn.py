@@ -0,0 +1,45 @@
+"""
+Unit-тесты для экспорта партий в PGN.
+"""
+import pytest
+import sys
+from pathlib import Path
+
+# Добавляем путь к backend модулю
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pgn import PGNExporter
+
+
+def test_export_pawn_move_without_piece_field():
+    """Компактная запись без поля piece нотируется как ход пешки."""
+    pgn = PGNExporter.export_game([{"from": [4, 6], "to": [4, 4]}])
+    assert "1. e2-e4" in pgn
+
+
+def test_export_piece_type_as_string():
+    """Тип фигуры строкой даёт правильный символ в нотации."""
+    history = [
+        {"from": [4, 6], "to": [4, 4]},
+        {"from": [6, 0], "to": [5, 2], "piece": "knight"},
+    ]
+    pgn = PGNExporter.export_game(history)
+    assert "Ng8-f6" in pgn
+
+
+def test_export_piece_type_legacy_dict():
+    """Старый формат {"type": ...} по-прежнему поддерживается."""
+    history = [{"from": [3, 7], "to": [3, 3], "piece": {"type": "queen"}}]
+    pgn = PGNExporter.export_game(history)
+    assert "Qd1-d5" in pgn
+
+
+def test_export_capture_notation():
+    """Взятие фигурой нотируется через x с символом фигуры."""
+    history = [{"from": [0, 7], "to": [0, 0], "piece": "rook", "captured": "rook"}]
+    pgn = PGNExporter.export_game(history)
+    assert "Ra1xa8" in pgn
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
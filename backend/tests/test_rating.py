@@ -2,6 +2,7 @@
 Unit-тесты для рейтинговой системы.
 """
 import pytest
+import pytest_asyncio
 import asyncio
 import sys
 from pathlib import Path
@@ -11,18 +12,26 @@ import os
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from rating import RatingSystem
-from database import Database
+from database import Database, db as global_db
 
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def test_db():
     """Создаёт тестовую базу данных."""
     db = Database("test_chess.db")
     await db.initialize()
     yield db
-    # Очистка после тестов
-    if os.path.exists("test_chess.db"):
-        os.remove("test_chess.db")
+    # Закрываем соединения: поток aiosqlite не-демонический, иначе
+    # интерпретатор не завершится; глобальный db сбрасываем, чтобы
+    # следующий тест открыл свежий файл, а не удалённый inode
+    await db.close()
+    await global_db.close()
+    global_db._initialized = False
+    RatingSystem.invalidate_cache()
+    # Очистка после тестов (вместе с WAL-сайдкарами)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"test_chess.db{suffix}"):
+            os.remove(f"test_chess.db{suffix}")
 
 
 @pytest.mark.asyncio
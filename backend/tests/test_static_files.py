@@ -28,6 +28,13 @@ def test_v27_css():
     assert response.status_code == 200
     assert "text/css" in response.headers["content-type"] or "stylesheet" in response.headers.get("content-type", "")
 
+    # Повторный запрос с ETag должен отвечаться 304 без тела
+    etag = response.headers.get("etag")
+    assert etag
+    revalidated = client.get("/v2.7/static/style.css", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
 
 def test_v27_game_js():
     """Проверка доступности game.js."""
@@ -35,6 +42,13 @@ def test_v27_game_js():
     assert response.status_code == 200
     assert "application/javascript" in response.headers["content-type"] or "javascript" in response.headers.get("content-type", "")
 
+    # Повторный запрос с ETag должен отвечаться 304 без тела
+    etag = response.headers.get("etag")
+    assert etag
+    revalidated = client.get("/v2.7/game.js", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
 
 def test_v27_static_js_files():
     """Проверка доступности JS файлов из static/."""
@@ -44,3 +58,10 @@ def test_v27_static_js_files():
         assert response.status_code == 200, f"Файл {js_file} недоступен"
         assert "javascript" in response.headers.get("content-type", "").lower() or "application/javascript" in response.headers.get("content-type", "")
 
+        # Повторный запрос с ETag должен отвечаться 304 без тела
+        etag = response.headers.get("etag")
+        assert etag, f"Нет ETag для {js_file}"
+        revalidated = client.get(f"/v2.7/static/{js_file}", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304, f"Нет 304 для {js_file}"
+        assert revalidated.content == b""
+
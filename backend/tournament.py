@@ -1,8 +1,9 @@
 # tournament.py - Система турниров
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import uuid
 import time
 from enum import Enum
+from sortedcontainers import SortedList
 
 
 class TournamentType(Enum):
@@ -34,6 +35,14 @@ class Tournament:
         self.rounds: List[Dict] = []
         self.current_round = 0
         self.standings: Dict[str, Dict] = {}  # player_id -> {wins, draws, losses, points}
+        # Сыгранные пары как битовые маски: игроку при регистрации выдаётся
+        # порядковый номер, и «a играл с b» — это один бит в слове a.
+        # Проверка в переборе пар — одно И вместо хеширования множества
+        self._ordinal: Dict[str, int] = {}  # player_id -> порядковый номер
+        self._played: List[int] = []  # маски соперников по порядковым номерам
+        # Таблица мест, поддерживаемая отсортированной инкрементально:
+        # ключи (-очки, player_id), обновляются при каждом результате
+        self._ranked: SortedList = SortedList()
         self.created_at = time.time()
     
     def register_player(self, player_id: str) -> bool:
@@ -46,12 +55,15 @@ class Tournament:
             return False
         
         self.players.append(player_id)
+        self._ordinal[player_id] = len(self._played)
+        self._played.append(0)
         self.standings[player_id] = {
             "wins": 0,
             "draws": 0,
             "losses": 0,
             "points": 0
         }
+        self._ranked.add((0, player_id))
         return True
     
     def unregister_player(self, player_id: str) -> bool:
@@ -59,7 +71,10 @@ class Tournament:
         if player_id in self.players:
             self.players.remove(player_id)
             if player_id in self.standings:
+                self._ranked.remove((-self.standings[player_id]["points"], player_id))
                 del self.standings[player_id]
+            # Порядковый номер не переиспользуется: маски остальных игроков
+            # могут ссылаться на его бит
             return True
         return False
     
@@ -82,24 +97,10 @@ class Tournament:
     
     def _create_swiss_round(self):
         """Создать раунд по швейцарской системе"""
-        # Упрощённая реализация - парим игроков по рейтингу
+        # Парим соседей по очкам, избегая повторных встреч
         sorted_players = sorted(self.players, key=lambda p: self.standings[p]["points"], reverse=True)
-        
-        pairs = []
-        used = set()
-        
-        for i, player1 in enumerate(sorted_players):
-            if player1 in used:
-                continue
-            
-            # Ищем соперника
-            for j, player2 in enumerate(sorted_players[i+1:], i+1):
-                if player2 not in used:
-                    pairs.append((player1, player2))
-                    used.add(player1)
-                    used.add(player2)
-                    break
-        
+        pairs = self._pair_players(sorted_players)
+
         round_data = {
             "round_number": self.current_round + 1,
             "pairs": pairs,
@@ -107,7 +108,46 @@ class Tournament:
         }
         
         self.rounds.append(round_data)
-    
+
+    def _pair_players(self, order: List[str]) -> List[Tuple[str, str]]:
+        """
+        Подбирает пары без повторных встреч, если такое паросочетание есть.
+
+        Жадное спаривание соседей по таблице загоняет хвост списка в уже
+        сыгранные пары; перебор с откатом пробует для верхнего игрока
+        ближайших по очкам соперников и отступает, когда остаток списка
+        спарить не удаётся. Взвешенное паросочетание (blossom) дало бы ещё
+        и оптимальность по разнице очков, но тянуло бы внешнюю зависимость
+        ради max_players игроков — при таких n перебор решает задачу точно.
+
+        Args:
+            order: Игроки в порядке убывания очков
+
+        Returns:
+            Список пар; при нечётном числе игроков последний остаётся без пары
+        """
+        def backtrack(remaining: List[str]) -> Optional[List[Tuple[str, str]]]:
+            if len(remaining) < 2:
+                return []
+            first = remaining[0]
+            played_mask = self._played[self._ordinal[first]]
+            for k in range(1, len(remaining)):
+                partner = remaining[k]
+                if played_mask >> self._ordinal[partner] & 1:
+                    continue
+                rest = remaining[1:k] + remaining[k + 1:]
+                tail = backtrack(rest)
+                if tail is not None:
+                    return [(first, partner)] + tail
+            return None
+
+        pairs = backtrack(order)
+        if pairs is None:
+            # Без повторов не спарить (поздние раунды маленького турнира) —
+            # откатываемся к прежнему жадному спариванию соседей
+            pairs = [(order[i], order[i + 1]) for i in range(0, len(order) - 1, 2)]
+        return pairs
+
     def _create_round_robin_rounds(self):
         """Создать все раунды для круговой системы"""
         # Каждый играет с каждым
@@ -137,25 +177,44 @@ class Tournament:
             return
         
         round_data = self.rounds[self.current_round]
-        pair_key = f"{player1}-{player2}"
-        
+        # Кортеж в нормализованном порядке вместо f-строки: без форматирования
+        # на каждый вызов и без неоднозначности разделителя в ID, а (a, b)
+        # и (b, a) попадают в одну запись
+        pair_key = (player1, player2) if player1 < player2 else (player2, player1)
+
         if pair_key not in round_data["results"]:
             round_data["results"][pair_key] = result
-            
+
+            # Запоминаем встречу, чтобы следующие раунды её не повторяли
+            i, j = self._ordinal[player1], self._ordinal[player2]
+            self._played[i] |= 1 << j
+            self._played[j] |= 1 << i
+
             # Обновляем таблицу
             if result == "1-0":
                 self.standings[player1]["wins"] += 1
-                self.standings[player1]["points"] += 1
+                self._add_points(player1, 1)
                 self.standings[player2]["losses"] += 1
             elif result == "0-1":
                 self.standings[player2]["wins"] += 1
-                self.standings[player2]["points"] += 1
+                self._add_points(player2, 1)
                 self.standings[player1]["losses"] += 1
             elif result == "1/2-1/2":
                 self.standings[player1]["draws"] += 1
-                self.standings[player1]["points"] += 0.5
+                self._add_points(player1, 0.5)
                 self.standings[player2]["draws"] += 1
-                self.standings[player2]["points"] += 0.5
+                self._add_points(player2, 0.5)
+
+    def _add_points(self, player_id: str, points: float):
+        """Начисляет очки и переставляет игрока в отсортированной таблице мест."""
+        stats = self.standings[player_id]
+        self._ranked.remove((-stats["points"], player_id))
+        stats["points"] += points
+        self._ranked.add((-stats["points"], player_id))
+
+    def get_rank(self, player_id: str) -> int:
+        """Место игрока в таблице (с нуля) за O(log n)."""
+        return self._ranked.index((-self.standings[player_id]["points"], player_id))
     
     def next_round(self) -> bool:
         """Перейти к следующему раунду"""
@@ -176,17 +235,20 @@ class Tournament:
         self.status = TournamentStatus.FINISHED
         return False
     
-    def get_standings(self) -> List[Dict]:
-        """Получить таблицу турнира"""
-        standings_list = []
-        for player_id, stats in self.standings.items():
-            standings_list.append({
-                "player_id": player_id,
-                **stats
-            })
-        
-        standings_list.sort(key=lambda x: x["points"], reverse=True)
-        return standings_list
+    def get_standings(self, top: Optional[int] = None) -> List[Dict]:
+        """
+        Получить таблицу турнира.
+
+        Args:
+            top: Вернуть только первые N мест (по умолчанию всю таблицу)
+        """
+        # Список мест уже отсортирован (поддерживается при записи
+        # результатов), поэтому верх таблицы — это срез, а не heapq.nlargest
+        ranked = self._ranked if top is None else self._ranked[:top]
+        return [
+            {"player_id": player_id, **self.standings[player_id]}
+            for _, player_id in ranked
+        ]
     
     def to_dict(self) -> Dict:
         """Конвертировать турнир в словарь"""
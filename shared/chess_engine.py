@@ -1,6 +1,7 @@
 """
 Шахматный движок - общие классы для логики игры.
 """
+from collections import OrderedDict
 from enum import Enum
 from typing import List, Tuple, Optional
 
@@ -15,6 +16,87 @@ class PieceType(Enum):
     KING = "king"
 
 
+def _jump_targets(offsets):
+    """Таблица «клетка 0..63 -> кортеж досягаемых клеток» для прыжковых фигур."""
+    return tuple(
+        tuple(
+            (x + dx, y + dy)
+            for dx, dy in offsets
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8
+        )
+        for x in range(8)
+        for y in range(8)
+    )
+
+
+# Цели прыжков коня и короля, развёрнутые по клеткам при импорте: смещения,
+# выходящие за доску, отфильтрованы заранее, поэтому генерация ходов не
+# делает проверок границ вовсе. Индекс в таблице — x * 8 + y
+_KNIGHT_TARGETS = _jump_targets(
+    ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+)
+_KING_TARGETS = _jump_targets(
+    ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+)
+
+
+def _ray_targets(directions):
+    """Таблица «клетка 0..63 -> кортеж лучей» для линейных фигур.
+
+    Каждый луч — клетки по одному направлению в порядке удаления от фигуры;
+    обход останавливается на первой занятой, поэтому границы и арифметику
+    шага достаточно просчитать один раз при импорте.
+    """
+    table = []
+    for x in range(8):
+        for y in range(8):
+            rays = []
+            for dx, dy in directions:
+                ray = []
+                nx, ny = x + dx, y + dy
+                while 0 <= nx < 8 and 0 <= ny < 8:
+                    ray.append((nx, ny))
+                    nx += dx
+                    ny += dy
+                if ray:
+                    rays.append(tuple(ray))
+            table.append(tuple(rays))
+    return tuple(table)
+
+
+_ROOK_RAYS = _ray_targets(((-1, 0), (1, 0), (0, -1), (0, 1)))
+_BISHOP_RAYS = _ray_targets(((-1, -1), (-1, 1), (1, -1), (1, 1)))
+_QUEEN_RAYS = tuple(r + b for r, b in zip(_ROOK_RAYS, _BISHOP_RAYS))
+
+
+def _pawn_targets(direction):
+    """Пешечные таблицы для одного направления движения.
+
+    Возвращает три таблицы по 64 клеткам: ход вперёд (или None у края),
+    двойной ход (или None) и кортеж клеток взятия по диагоналям —
+    границы доски учтены при импорте, в генерации ходов их нет.
+    """
+    pushes = []
+    doubles = []
+    attacks = []
+    for x in range(8):
+        for y in range(8):
+            ny = y + direction
+            pushes.append((x, ny) if 0 <= ny < 8 else None)
+            ny2 = y + 2 * direction
+            doubles.append((x, ny2) if 0 <= ny2 < 8 else None)
+            attacks.append(tuple(
+                (x + dx, ny)
+                for dx in (-1, 1)
+                if 0 <= x + dx < 8 and 0 <= ny < 8
+            ))
+    return tuple(pushes), tuple(doubles), tuple(attacks)
+
+
+# (ход, двойной ход, взятия) по цвету; белые ходят в сторону y=0
+_PAWN_TABLES = {"white": _pawn_targets(-1), "black": _pawn_targets(1)}
+
+
 class ChessPiece:
     """
     Базовый класс шахматной фигуры.
@@ -25,7 +107,11 @@ class ChessPiece:
         position: Позиция на доске (x, y)
         moved: Флаг, была ли фигура перемещена
     """
-    
+
+    # Фиксированные слоты вместо __dict__: фигур создаётся 32 на партию и
+    # больше при превращениях, а их атрибуты читаются в самых горячих циклах
+    __slots__ = ("color", "type", "position", "moved")
+
     def __init__(self, color: str, piece_type: PieceType, position: Tuple[int, int]):
         """
         Инициализирует шахматную фигуру.
@@ -61,43 +147,41 @@ class ChessPiece:
         attacks = []
         
         if self.type == PieceType.PAWN:
-            direction = -1 if self.color == "white" else 1
+            pushes, doubles, attack_targets = _PAWN_TABLES[self.color]
+            sq = x * 8 + y
             # Ход вперёд
-            if 0 <= y + direction < 8 and not board[x][y + direction]:
-                moves.append((x, y + direction))
+            push = pushes[sq]
+            if push is not None and not board[push[0]][push[1]]:
+                moves.append(push)
                 # Двойной ход
-                if not self.moved and 0 <= y + 2 * direction < 8 and not board[x][y + 2 * direction]:
-                    moves.append((x, y + 2 * direction))
+                double = doubles[sq]
+                if not self.moved and double is not None and not board[double[0]][double[1]]:
+                    moves.append(double)
             # Атаки по диагонали
-            for dx in [-1, 1]:
-                nx, ny = x + dx, y + direction
-                if 0 <= nx < 8 and 0 <= ny < 8:
-                    target = board[nx][ny]
-                    if target and target.color != self.color:
-                        attacks.append((nx, ny))
-                    # Взятие на проходе
-                    elif en_passant_target and (nx, ny) == en_passant_target:
-                        attacks.append((nx, ny))
-        
+            for nx, ny in attack_targets[sq]:
+                target = board[nx][ny]
+                if target and target.color != self.color:
+                    attacks.append((nx, ny))
+                # Взятие на проходе: сравниваем покомпонентно, не собирая
+                # кортеж (nx, ny) на каждую клетку взятия
+                elif (en_passant_target is not None
+                      and nx == en_passant_target[0] and ny == en_passant_target[1]):
+                    attacks.append((nx, ny))
+
         elif self.type == PieceType.ROOK:
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
+            moves, attacks = self._get_linear_moves(board, _ROOK_RAYS[x * 8 + y])
         
         elif self.type == PieceType.KNIGHT:
-            offsets = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-            moves, attacks = self._get_jump_moves(board, offsets)
+            moves, attacks = self._get_jump_moves(board, _KNIGHT_TARGETS[x * 8 + y])
         
         elif self.type == PieceType.BISHOP:
-            directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
-        
+            moves, attacks = self._get_linear_moves(board, _BISHOP_RAYS[x * 8 + y])
+
         elif self.type == PieceType.QUEEN:
-            directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-            moves, attacks = self._get_linear_moves(board, directions)
+            moves, attacks = self._get_linear_moves(board, _QUEEN_RAYS[x * 8 + y])
         
         elif self.type == PieceType.KING:
-            offsets = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-            moves, attacks = self._get_jump_moves(board, offsets)
+            moves, attacks = self._get_jump_moves(board, _KING_TARGETS[x * 8 + y])
             # Рокировка
             if not self.moved:
                 if self._can_castle(board, 'kingside', check_castling_safety):
@@ -107,36 +191,41 @@ class ChessPiece:
         
         return moves, attacks
     
-    def _get_linear_moves(self, board, directions):
-        """Вспомогательный метод для линейных ходов (ладья, слон, ферзь)."""
-        x, y = self.position
+    def _get_linear_moves(self, board, rays):
+        """Вспомогательный метод для линейных ходов (ладья, слон, ферзь).
+
+        rays — заранее просчитанные лучи из таблиц _ROOK_RAYS /
+        _BISHOP_RAYS / _QUEEN_RAYS.
+        """
         moves = []
         attacks = []
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            while 0 <= nx < 8 and 0 <= ny < 8:
-                if board[nx][ny]:
-                    if board[nx][ny].color != self.color:
+        color = self.color
+        for ray in rays:
+            for nx, ny in ray:
+                target = board[nx][ny]
+                if target:
+                    if target.color != color:
                         attacks.append((nx, ny))
                     break
                 moves.append((nx, ny))
-                nx += dx
-                ny += dy
         return moves, attacks
     
-    def _get_jump_moves(self, board, offsets):
-        """Вспомогательный метод для прыжковых ходов (конь, король)."""
-        x, y = self.position
+    def _get_jump_moves(self, board, targets):
+        """Вспомогательный метод для прыжковых ходов (конь, король).
+
+        targets — заранее отфильтрованные по границам клетки из таблиц
+        _KNIGHT_TARGETS / _KING_TARGETS.
+        """
         moves = []
         attacks = []
-        for dx, dy in offsets:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 8 and 0 <= ny < 8:
-                if board[nx][ny]:
-                    if board[nx][ny].color != self.color:
-                        attacks.append((nx, ny))
-                else:
-                    moves.append((nx, ny))
+        color = self.color
+        for nx, ny in targets:
+            target = board[nx][ny]
+            if target:
+                if target.color != color:
+                    attacks.append((nx, ny))
+            else:
+                moves.append((nx, ny))
         return moves, attacks
     
     def _can_castle(self, board, side, check_castling_safety=None):
@@ -166,9 +255,61 @@ class ChessPiece:
         return True
 
 
+# Коды фигур для компактного представления доски: 0 — пустая клетка,
+# 1..6 — белые, 7..12 — чёрные (в порядке объявления PieceType)
+_PIECE_CODES = {
+    (color, piece_type): base + i
+    for base, color in ((1, "white"), (7, "black"))
+    for i, piece_type in enumerate(PieceType)
+}
+
+
+_BACK_ROW = (
+    PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP, PieceType.QUEEN,
+    PieceType.KING, PieceType.BISHOP, PieceType.KNIGHT, PieceType.ROOK
+)
+
+# Начальная расстановка, развёрнутая при импорте: (x, y, цвет, тип) для всех
+# 32 фигур. Копировать доску как буфер байтов нельзя — в клетках лежат
+# изменяемые объекты фигур, — поэтому init_board делает один проход по
+# готовому списку вместо четырёх циклов с ветвлением
+_INITIAL_LAYOUT = tuple(
+    [(x, 0, "black", piece_type) for x, piece_type in enumerate(_BACK_ROW)]
+    + [(x, 1, "black", PieceType.PAWN) for x in range(8)]
+    + [(x, 6, "white", PieceType.PAWN) for x in range(8)]
+    + [(x, 7, "white", piece_type) for x, piece_type in enumerate(_BACK_ROW)]
+)
+
+
 class ChessBoard:
     """Класс для работы с шахматной доской."""
-    
+
+    @staticmethod
+    def pack(board: List[List[Optional[ChessPiece]]]) -> bytes:
+        """
+        Упаковывает доску в 64 байта кодов фигур.
+
+        Компактное представление позиции для ключей кэшей и сравнения:
+        один непрерывный буфер вместо структуры из 64 ссылок на объекты.
+        Полностью переводить доску на такой формат не стали — список
+        списков с фигурами остаётся публичным API движка, — поэтому
+        плотная раскладка живёт рядом как производное представление.
+
+        Args:
+            board: Доска 8x8
+
+        Returns:
+            64 байта кодов фигур в порядке обхода x, затем y
+        """
+        codes = bytearray(64)
+        i = 0
+        for row in board:
+            for piece in row:
+                if piece is not None:
+                    codes[i] = _PIECE_CODES[(piece.color, piece.type)]
+                i += 1
+        return bytes(codes)
+
     @staticmethod
     def init_board() -> List[List[Optional[ChessPiece]]]:
         """
@@ -177,27 +318,12 @@ class ChessBoard:
         Returns:
             Двумерный массив 8x8 с ChessPiece объектами или None
         """
-        board: List[List[Optional[ChessPiece]]] = [[None for _ in range(8)] for _ in range(8)]
-        
-        # Расставляем фигуры
-        back_row = [
-            (0, PieceType.ROOK), (1, PieceType.KNIGHT), (2, PieceType.BISHOP),
-            (3, PieceType.QUEEN), (4, PieceType.KING),
-            (5, PieceType.BISHOP), (6, PieceType.KNIGHT), (7, PieceType.ROOK)
-        ]
-        
-        # Чёрные фигуры (верх доски, y=0-1)
-        for x, piece_type in back_row:
-            board[x][0] = ChessPiece("black", piece_type, (x, 0))
-        for x in range(8):
-            board[x][1] = ChessPiece("black", PieceType.PAWN, (x, 1))
-        
-        # Белые фигуры (низ доски, y=6-7)
-        for x, piece_type in back_row:
-            board[x][7] = ChessPiece("white", piece_type, (x, 7))
-        for x in range(8):
-            board[x][6] = ChessPiece("white", PieceType.PAWN, (x, 6))
-        
+        board: List[List[Optional[ChessPiece]]] = [[None] * 8 for _ in range(8)]
+
+        # Расставляем фигуры по развёрнутому шаблону начальной позиции
+        for x, y, color, piece_type in _INITIAL_LAYOUT:
+            board[x][y] = ChessPiece(color, piece_type, (x, y))
+
         return board
     
     @staticmethod
@@ -232,27 +358,108 @@ class ChessBoard:
         return board[x][y]
 
 
+# Кэш проверки шаха: во время перебора кандидатов хода одни и те же позиции
+# встречаются многократно, а ответ целиком определяется расстановкой фигур.
+# Ключ — упакованная доска (ChessBoard.pack): инкрементальный Zobrist-хэш
+# здесь не удержать, доску мутируют снаружи движка. Флаги moved и взятие на
+# проходе на ответ не влияют: клетка короля занята, и попасть в неё можно
+# только атакой, а атаки зависят лишь от расстановки
+_CHECK_CACHE_SIZE = 1024
+_check_cache: "OrderedDict[Tuple[bytes, str], bool]" = OrderedDict()
+
+
 class ChessRules:
     """Класс для проверки шахматных правил."""
     
     @staticmethod
-    def is_square_attacked(square: Tuple[int, int], by_color: str, 
+    def is_square_attacked(square: Tuple[int, int], by_color: str,
                           board: List[List[Optional[ChessPiece]]]) -> bool:
         """
         Проверяет, атакована ли клетка фигурами указанного цвета.
-        
+
+        Клетка «прощупывается» в обратную сторону: поля коня, соседи
+        короля, лучи ладьи/слона и пешечные диагонали — не больше ~28
+        посещённых клеток с выходом на первом атакующем и без генерации
+        списков ходов. Считаются только взятия; тихие ходы (в отличие от
+        is_square_attacked_slow) атакой не являются.
+
         Args:
             square: Позиция для проверки (x, y)
             by_color: Цвет атакующих фигур
             board: Доска 8x8
-            
+
         Returns:
             True если клетка атакована
         """
+        if not ChessBoard.validate_position(square):
+            return False
         x, y = square
+        occupant = board[x][y]
+        if occupant is not None and occupant.color == by_color:
+            # Свою фигуру сторона не атакует — как и в медленной версии,
+            # где такая клетка не попадает ни в ходы, ни во взятия
+            return False
+        sq = x * 8 + y
+
+        # Конь и король — по таблицам прыжков
+        for nx, ny in _KNIGHT_TARGETS[sq]:
+            piece = board[nx][ny]
+            if piece is not None and piece.color == by_color and piece.type == PieceType.KNIGHT:
+                return True
+        for nx, ny in _KING_TARGETS[sq]:
+            piece = board[nx][ny]
+            if piece is not None and piece.color == by_color and piece.type == PieceType.KING:
+                return True
+
+        # Линейные фигуры — первый встречный по каждому лучу
+        for ray in _ROOK_RAYS[sq]:
+            for nx, ny in ray:
+                piece = board[nx][ny]
+                if piece is not None:
+                    if piece.color == by_color and (piece.type == PieceType.ROOK
+                                                    or piece.type == PieceType.QUEEN):
+                        return True
+                    break
+        for ray in _BISHOP_RAYS[sq]:
+            for nx, ny in ray:
+                piece = board[nx][ny]
+                if piece is not None:
+                    if piece.color == by_color and (piece.type == PieceType.BISHOP
+                                                    or piece.type == PieceType.QUEEN):
+                        return True
+                    break
+
+        # Пешка бьёт сюда с клетки, куда с этой бьёт пешка противоположного
+        # направления — берём таблицу взятий другого цвета
+        probe_color = "black" if by_color == "white" else "white"
+        for nx, ny in _PAWN_TABLES[probe_color][2][sq]:
+            piece = board[nx][ny]
+            if piece is not None and piece.color == by_color and piece.type == PieceType.PAWN:
+                return True
+
+        return False
+
+    @staticmethod
+    def is_square_attacked_slow(square: Tuple[int, int], by_color: str,
+                                board: List[List[Optional[ChessPiece]]]) -> bool:
+        """
+        Прежняя проверка атакованности перебором всех фигур.
+
+        Оставлена для перекрёстной сверки с быстрой версией. Семантика
+        шире: клетка считается «атакованной», если она вообще достижима
+        фигурой by_color, включая тихие ходы (как в attacked_squares).
+
+        Args:
+            square: Позиция для проверки (x, y)
+            by_color: Цвет атакующих фигур
+            board: Доска 8x8
+
+        Returns:
+            True если клетка достижима
+        """
         if not ChessBoard.validate_position(square):
             return False
-        
+
         # Проверяем все фигуры противоположного цвета
         for px in range(8):
             for py in range(8):
@@ -261,9 +468,38 @@ class ChessRules:
                     moves, attacks = piece.get_valid_moves(board)
                     if square in moves or square in attacks:
                         return True
-        
+
         return False
-    
+
+    @staticmethod
+    def attacked_squares(by_color: str,
+                         board: List[List[Optional[ChessPiece]]]) -> set:
+        """
+        Собирает все клетки, достижимые фигурами указанного цвета.
+
+        Один проход по доске вместо повторных вызовов is_square_attacked:
+        множество строится за цену одной проверки без раннего выхода, а
+        каждый следующий вопрос «атакована ли клетка» стоит O(1). Выгодно,
+        когда по одной и той же позиции проверяется несколько клеток —
+        например, три клетки пути короля при рокировке.
+
+        Args:
+            by_color: Цвет атакующих фигур
+            board: Доска 8x8
+
+        Returns:
+            Множество позиций (x, y), достижимых фигурами by_color
+        """
+        attacked = set()
+        for px in range(8):
+            for py in range(8):
+                piece = board[px][py]
+                if piece and piece.color == by_color:
+                    moves, attacks = piece.get_valid_moves(board)
+                    attacked.update(moves)
+                    attacked.update(attacks)
+        return attacked
+
     @staticmethod
     def is_in_check(color: str, board: List[List[Optional[ChessPiece]]]) -> bool:
         """
@@ -276,6 +512,12 @@ class ChessRules:
         Returns:
             True если король под шахом
         """
+        key = (ChessBoard.pack(board), color)
+        cached = _check_cache.get(key)
+        if cached is not None:
+            _check_cache.move_to_end(key)
+            return cached
+
         # Находим короля
         king_pos = None
         for x in range(8):
@@ -286,13 +528,18 @@ class ChessRules:
                     break
             if king_pos:
                 break
-        
+
         if not king_pos:
-            return False
-        
-        # Проверяем, атакована ли позиция короля
-        opponent = "black" if color == "white" else "white"
-        return ChessRules.is_square_attacked(king_pos, opponent, board)
+            in_check = False
+        else:
+            # Проверяем, атакована ли позиция короля
+            opponent = "black" if color == "white" else "white"
+            in_check = ChessRules.is_square_attacked(king_pos, opponent, board)
+
+        if len(_check_cache) >= _CHECK_CACHE_SIZE:
+            _check_cache.popitem(last=False)
+        _check_cache[key] = in_check
+        return in_check
     
     @staticmethod
     def is_checkmate(color: str, board: List[List[Optional[ChessPiece]]], 
@@ -54,6 +54,13 @@ class TestChessPiece:
         # Конь может ходить на 8 позиций из начальной позиции
         assert len(moves) + len(attacks) == 2  # Только 2 доступны с края доски
     
+    def test_piece_slots(self):
+        """Тест компактности фигуры: атрибуты в __slots__, без __dict__."""
+        piece = ChessPiece("white", PieceType.PAWN, (0, 6))
+        assert not hasattr(piece, "__dict__")
+        with pytest.raises(AttributeError):
+            piece.extra = 1
+
     def test_king_moves(self):
         """Тест ходов короля."""
         board = [[None for _ in range(8)] for _ in range(8)]